@@ -0,0 +1,118 @@
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+ARXIV_NS = "http://arxiv.org/schemas/atom"
+OPENSEARCH_NS = "http://a9.com/-/spec/opensearch/1.1/"
+
+_ENTRY_TAG = f"{{{ATOM_NS}}}entry"
+_TOTAL_RESULTS_TAG = f"{{{OPENSEARCH_NS}}}totalResults"
+_ID_TAG = f"{{{ATOM_NS}}}id"
+_TITLE_TAG = f"{{{ATOM_NS}}}title"
+_SUMMARY_TAG = f"{{{ATOM_NS}}}summary"
+_PUBLISHED_TAG = f"{{{ATOM_NS}}}published"
+_UPDATED_TAG = f"{{{ATOM_NS}}}updated"
+_AUTHOR_TAG = f"{{{ATOM_NS}}}author"
+_NAME_TAG = f"{{{ATOM_NS}}}name"
+_CATEGORY_TAG = f"{{{ATOM_NS}}}category"
+_PRIMARY_CATEGORY_TAG = f"{{{ARXIV_NS}}}primary_category"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def parse_datetime(value):
+    """arXivの日付文字列（2017-06-12T17:57:34Z）をdatetimeに変換"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return datetime.now(timezone.utc)
+
+
+def parse_entry(entry):
+    """entry要素から正規化した論文データを作る（エラーエントリは None）"""
+    raw_id = entry.findtext(_ID_TAG) or ""
+    if "/abs/" not in raw_id:
+        # id_listに存在しないIDを渡すとエラー用のエントリが返る
+        return None
+
+    paper_id = raw_id.split("/abs/")[-1].strip()
+    published = (entry.findtext(_PUBLISHED_TAG) or "").strip()
+    primary = entry.find(_PRIMARY_CATEGORY_TAG)
+
+    paper_data = {
+        'id': paper_id,
+        'title': _WHITESPACE_RE.sub(" ", entry.findtext(_TITLE_TAG) or "").strip(),
+        'summary': (entry.findtext(_SUMMARY_TAG) or "").strip(),
+        'published': published,
+        'updated': (entry.findtext(_UPDATED_TAG) or "").strip(),
+        'authors': [author.findtext(_NAME_TAG)
+                    for author in entry.iter(_AUTHOR_TAG)],
+        'categories': [cat.get('term') for cat in entry.iter(_CATEGORY_TAG)],
+        'primary_category': primary.get('term') if primary is not None else None,
+        'entry_id': f"http://arxiv.org/abs/{paper_id}",
+        'pdf_url': f"http://arxiv.org/pdf/{paper_id}.pdf",
+        'published_datetime': parse_datetime(published),
+    }
+    return paper_data
+
+
+def iter_entries(source, feed_info=None):
+    """Atomフィードを逐次パースし、論文データを1件ずつ返す
+
+    source はファイルパスまたはバイナリのファイルライクオブジェクト。
+    処理済みの要素はすぐに捨てるため、件数が多くてもメモリ使用量は一定。
+    feed_info に辞書を渡すと 'total_results' を書き込む。
+    """
+    context = ET.iterparse(source, events=("start", "end"))
+    root = None
+    for event, elem in context:
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == _ENTRY_TAG:
+            paper_data = parse_entry(elem)
+            elem.clear()
+            if root is not None:
+                # 処理済みのentryをルートから外してツリーを育てない
+                root.remove(elem)
+            if paper_data is not None:
+                yield paper_data
+        elif elem.tag == _TOTAL_RESULTS_TAG and feed_info is not None:
+            try:
+                feed_info['total_results'] = int(elem.text)
+            except (TypeError, ValueError):
+                pass
+
+
+def iter_pages(fetch_page, page_size=100, max_results=None, start=0):
+    """start/max_resultsでページングしながら全エントリを返す
+
+    fetch_page(start, max_results) はそのページのレスポンス本体
+    （バイナリのファイルライクオブジェクト）を返す関数。
+    呼び出し側がイテレーションを止めれば以降のページは取得しない。
+    """
+    yielded = 0
+    while max_results is None or yielded < max_results:
+        size = page_size if max_results is None else min(page_size, max_results - yielded)
+        feed_info = {}
+        count = 0
+        stream = fetch_page(start, size)
+        try:
+            for paper_data in iter_entries(stream, feed_info):
+                count += 1
+                yielded += 1
+                yield paper_data
+                if max_results is not None and yielded >= max_results:
+                    return
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+        start += size
+        total = feed_info.get('total_results')
+        if count < size or (total is not None and start >= total):
+            return
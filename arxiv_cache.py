@@ -0,0 +1,319 @@
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# 名前空間ごとの有効期限（秒）
+DEFAULT_NAMESPACE_TTLS = {
+    "id": 7 * 24 * 3600,     # IDで引いた論文メタデータはほぼ変わらない
+    "title": 6 * 3600,       # タイトル検索は新しい版が出ることがある
+}
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 件数・サイズの合計はメモリで持ち、この回数の書き込みごとにDBから数え直す
+# （他のプロセスも同じDBに書くため、ずれを定期的に直す）
+RECOUNT_INTERVAL = 1000
+CACHE_DB_NAME = "cache.sqlite3"
+
+
+def normalize_query(query):
+    """キャッシュキー用にクエリを正規化（全角半角・大文字小文字・空白を統一）"""
+    text = unicodedata.normalize("NFKC", str(query))
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text
+
+
+def cache_key(namespace, query):
+    """正規化したクエリの安定したダイジェストからキーを作る
+
+    組み込みの hash() はプロセスごとにランダム化されるため使わない。
+    """
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def split_legacy_query(query):
+    """"id:xxx" / "title:xxx" 形式のクエリを (名前空間, クエリ) に分ける"""
+    namespace, sep, rest = str(query).partition(":")
+    if sep and namespace in DEFAULT_NAMESPACE_TTLS:
+        return namespace, rest
+    return "default", str(query)
+
+
+class CacheEntry:
+    """キャッシュの値と再検証に使う情報"""
+
+    def __init__(self, value, fresh, etag=None, last_modified=None, updated=None):
+        self.value = value
+        self.fresh = fresh
+        self.etag = etag
+        self.last_modified = last_modified
+        self.updated = updated
+
+    def conditional_headers(self):
+        """条件付きリクエストのヘッダー（検証子がなければ空）"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class CacheStore:
+    """SQLiteによる単一ファイルの永続キャッシュ
+
+    - キーは正規化したクエリのSHA-256（再起動・別プロセスでも同じキー）
+    - 件数・サイズ上限を超えたら最終アクセスの古いものから削除（LRU）
+    - 名前空間ごとにTTLを設定可能
+    - 期限切れでも値とレスポンスの検証子（ETag / Last-Modified）、論文の updated を残し、
+      変わっていないと確かめられれば refresh() で期限だけを延ばす
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 namespace_ttls=None, default_ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.namespace_ttls = dict(DEFAULT_NAMESPACE_TTLS)
+        if namespace_ttls:
+            self.namespace_ttls.update(namespace_ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.refetched = 0
+        self._totals = None  # (件数, バイト数)。None なら次の書き込みで数え直す
+        self._writes_since_recount = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                updated TEXT
+            )
+        """)
+        # 検証子の列がない古いDBに列を足す
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cache_entries)")}
+        for column in ("etag", "last_modified", "updated"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE cache_entries ADD COLUMN {column} TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries(accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_namespace ON cache_entries(namespace)"
+        )
+        self._conn.commit()
+
+    def ttl_for(self, namespace):
+        return self.namespace_ttls.get(namespace, self.default_ttl)
+
+    def lookup(self, namespace, query, max_age=None):
+        """期限切れも含めてエントリを取得（なし・破損時は None）"""
+        key = cache_key(namespace, query)
+        ttl = self.ttl_for(namespace) if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at, etag, last_modified, updated "
+                "FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at, etag, last_modified, updated = row
+            try:
+                result = pickle.loads(value)
+            except Exception:
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self._totals = None
+                self.misses += 1
+                return None
+            fresh = now - created_at < ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return CacheEntry(result, fresh, etag, last_modified, updated)
+
+    def get(self, namespace, query, max_age=None):
+        """キャッシュから値を取得（期限切れ・破損時は None）"""
+        entry = self.lookup(namespace, query, max_age=max_age)
+        if entry is None or not entry.fresh:
+            return None
+        return entry.value
+
+    def set(self, namespace, query, value, etag=None, last_modified=None, updated=None):
+        """値を保存し、上限を超えた分をLRUで削除
+
+        既存のエントリを置き換えた場合は再取得として数える。
+        """
+        key = cache_key(namespace, query)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT size FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if existing:
+                self.refetched += 1
+            if self._totals is not None:
+                count, total = self._totals
+                if existing:
+                    self._totals = (count, total - existing[0] + len(blob))
+                else:
+                    self._totals = (count + 1, total + len(blob))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(key, namespace, value, size, created_at, accessed_at, etag, last_modified, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, blob, len(blob), now, now, etag, last_modified, updated),
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def refresh(self, namespace, query, etag=None, last_modified=None):
+        """変わっていないと確かめたエントリの期限を延ばす（値は書き換えない）"""
+        key = cache_key(namespace, query)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE cache_entries SET created_at = ?, accessed_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                "WHERE key = ?",
+                (now, now, etag, last_modified, key),
+            )
+            self._conn.commit()
+            if cursor.rowcount:
+                self.revalidated += 1
+            return cursor.rowcount > 0
+
+    def delete(self, namespace, query):
+        key = cache_key(namespace, query)
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._conn.commit()
+            self._totals = None
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM cache_entries")
+            else:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ?", (namespace,)
+                )
+            self._conn.commit()
+            self._totals = None
+
+    def purge_expired(self):
+        """期限切れのエントリを名前空間ごとに削除し、削除件数を返す"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            namespaces = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT namespace FROM cache_entries"
+            )]
+            for namespace in namespaces:
+                cursor = self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND created_at <= ?",
+                    (namespace, now - self.ttl_for(namespace)),
+                )
+                removed += cursor.rowcount
+            self._conn.commit()
+            self._totals = None
+        return removed
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+            return {
+                "entries": count,
+                "bytes": total,
+                "hits": self.hits,
+                "stale": self.stale,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "refetched": self.refetched,
+            }
+
+    def _evict_locked(self):
+        """上限を超えていれば古いものから削除する（表全体の集計は毎回はしない）"""
+        self._writes_since_recount += 1
+        if self._totals is None or self._writes_since_recount >= RECOUNT_INTERVAL:
+            self._totals = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+            self._writes_since_recount = 0
+        count, total = self._totals
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 最終アクセスの索引を古い順にたどり、上限内に収まる分だけ読む
+        cursor = self._conn.execute(
+            "SELECT key, size FROM cache_entries ORDER BY accessed_at ASC"
+        )
+        victims = []
+        for key, size in cursor:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+        self._totals = (count, total)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def remove_legacy_pickles(cache_dir):
+    """hash()キーの旧pickleキャッシュを削除（再起動後は二度とヒットしないため）"""
+    removed = 0
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if name.endswith(".pkl"):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def open_cache_store(cache_dir, **kwargs):
+    """cache_dir 配下のキャッシュDBを開く"""
+    os.makedirs(cache_dir, exist_ok=True)
+    remove_legacy_pickles(cache_dir)
+    return CacheStore(os.path.join(cache_dir, CACHE_DB_NAME), **kwargs)
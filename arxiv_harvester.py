@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from arxiv_atom import iter_pages, parse_datetime
+from arxiv_cache import cache_key
+from http_session import PooledHttpSession
+from rate_limit import TokenBucket
+
+ARXIV_API_BASE = "http://export.arxiv.org/api/query"
+ARXIV_MIN_INTERVAL = 3       # arXiv APIへのリクエスト間隔（秒）
+HARVEST_PAGE_SIZE = 100
+HARVEST_MAX_RESULTS = 1000   # ウォーターマークが古くなっていても1回に取得する上限
+INITIAL_LOOKBACK_DAYS = 2    # 初回（ウォーターマークなし）に遡る日数
+HARVEST_DB_NAME = "harvest.sqlite3"
+
+
+class Watermark:
+    """処理済みの最新の投稿日時と、その日時ちょうどの論文ID"""
+
+    def __init__(self, published, ids):
+        self.published = published
+        self.ids = set(ids)
+
+    def covers(self, paper):
+        """その論文が処理済み（ウォーターマーク以前）かどうか"""
+        published = paper['published_datetime']
+        if published < self.published:
+            return True
+        return published == self.published and paper['id'] in self.ids
+
+    def as_dict(self):
+        return {"published": self.published.isoformat(), "ids": sorted(self.ids)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(parse_datetime(data["published"]), data["ids"])
+
+
+class ArxivHarvester:
+    """前回の続きから新着論文だけを取得するハーベスタ
+
+    submittedDate の新しい順にページを進め、ウォーターマーク以前の論文に
+    到達した時点で止まる。取得した論文は store（PaperIndexなど add_many を持つもの）
+    にページ単位で流し込む。ウォーターマークは commit() で確定するまで進めないため、
+    投稿に失敗した回は次回に同じ論文を取り直せる。長く止まっていた後でも
+    1回に取得するのは max_results 件まで（それより古い論文は取得しない）。
+    """
+
+    def __init__(self, state_path, store=None, http=None, rate_limiter=None,
+                 page_size=HARVEST_PAGE_SIZE, initial_lookback_days=INITIAL_LOOKBACK_DAYS,
+                 max_results=HARVEST_MAX_RESULTS):
+        self.store = store
+        self.http = http if http is not None else PooledHttpSession()
+        self.rate_limiter = rate_limiter or TokenBucket(rate=1 / ARXIV_MIN_INTERVAL, capacity=1)
+        self.page_size = page_size
+        self.initial_lookback = timedelta(days=initial_lookback_days)
+        self.max_results = max_results
+        self.requests = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(state_path, timeout=30, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS harvest_state (
+                query_key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                published TEXT NOT NULL,
+                ids TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def watermark(self, query):
+        with self._lock:
+            return self._load(query)
+
+    def _load(self, query):
+        row = self._conn.execute(
+            "SELECT published, ids FROM harvest_state WHERE query_key = ?",
+            (cache_key("harvest", query),),
+        ).fetchone()
+        if row is None:
+            return None
+        return Watermark(parse_datetime(row[0]), json.loads(row[1]))
+
+    def _fetch_page(self, query, start, size):
+        self.rate_limiter.acquire()
+        self.requests += 1
+        params = {
+            'search_query': query,
+            'start': start,
+            'max_results': size,
+            'sortBy': 'submittedDate',
+            'sortOrder': 'descending',
+        }
+        return self.http.get_stream(ARXIV_API_BASE, params=params)
+
+    def harvest(self, query, max_results=None):
+        """ウォーターマークより新しい論文を新しい順に返す（max_results 件まで）"""
+        if max_results is None:
+            max_results = self.max_results
+        watermark = self.watermark(query)
+        cutoff = None
+        if watermark is None:
+            cutoff = datetime.now(timezone.utc) - self.initial_lookback
+
+        new_papers = []
+        page = []
+        pages = iter_pages(lambda start, size: self._fetch_page(query, start, size),
+                           page_size=self.page_size, max_results=max_results)
+        try:
+            for paper in pages:
+                if watermark is not None and watermark.covers(paper):
+                    break
+                if cutoff is not None and paper['published_datetime'] < cutoff:
+                    break
+                new_papers.append(paper)
+                page.append(paper)
+                if len(page) >= self.page_size:
+                    self._store(page)
+                    page = []
+        finally:
+            pages.close()
+        self._store(page)
+
+        if new_papers:
+            newest = new_papers[0]['published_datetime']
+            ids = [p['id'] for p in new_papers if p['published_datetime'] == newest]
+            if watermark is not None and watermark.published == newest:
+                ids += list(watermark.ids)
+            self._pending[query] = Watermark(newest, ids)
+        return new_papers
+
+    def _store(self, papers):
+        if self.store is not None and papers:
+            self.store.add_many(papers)
+
+    def pending(self, query):
+        """harvest で得た、まだ commit していないウォーターマーク（なければ None）"""
+        return self._pending.get(query)
+
+    def commit(self, query, watermark=None):
+        """ウォーターマークを進める（省略時は harvest で得た分まで）
+
+        保存済みのものより古いウォーターマークでは戻さない。
+        """
+        pending = self._pending.pop(query, None)
+        if watermark is None:
+            watermark = pending
+        if watermark is None:
+            return
+        with self._lock:
+            current = self._load(query)
+            if current is not None:
+                if watermark.published < current.published:
+                    return
+                if watermark.published == current.published:
+                    watermark = Watermark(watermark.published, watermark.ids | current.ids)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO harvest_state (query_key, query, published, ids, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key("harvest", query), query, watermark.published.isoformat(),
+                 json.dumps(sorted(watermark.ids)), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_harvester(cache_dir, store=None, **kwargs):
+    """cache_dir 配下の状態DBを使うハーベスタを作る"""
+    return ArxivHarvester(os.path.join(cache_dir, HARVEST_DB_NAME), store=store, **kwargs)
@@ -0,0 +1,51 @@
+import re
+
+# 2007年3月より前の旧形式IDに使われていたアーカイブ名
+OLD_ARCHIVES = (
+    "acc-phys", "adap-org", "alg-geom", "ao-sci", "astro-ph", "atom-ph", "bayes-an",
+    "chao-dyn", "chem-ph", "cmp-lg", "comp-gas", "cond-mat", "cs", "dg-ga", "funct-an",
+    "gr-qc", "hep-ex", "hep-lat", "hep-ph", "hep-th", "math", "math-ph", "mtrl-th", "nlin",
+    "nucl-ex", "nucl-th", "patt-sol", "physics", "plasm-ph", "q-alg", "q-bio", "quant-ph",
+    "solv-int", "supr-con",
+)
+_OLD_ARCHIVE = "(?:" + "|".join(re.escape(name) for name in OLD_ARCHIVES) + ")"
+
+# 1件のURL・IDの入力に使うパターン（先に一致したものを採用）
+URL_PATTERNS = [re.compile(pattern) for pattern in [
+    r'arxiv\.org/abs/([0-9]{4}\.[0-9]{4,5}v?[0-9]*)',
+    r'arxiv\.org/pdf/([0-9]{4}\.[0-9]{4,5}v?[0-9]*)\.pdf',
+    r'^([0-9]{4}\.[0-9]{4,5}v?[0-9]*)$',
+    rf'arxiv\.org/abs/({_OLD_ARCHIVE}/[0-9]{{7}})',  # 古い形式
+    rf'arxiv\.org/pdf/({_OLD_ARCHIVE}/[0-9]{{7}})',  # 古い形式
+]]
+
+# 任意のテキスト（URLの一覧、BibTeX、貼り付けた文章）からIDを拾うパターン
+# 新形式は YYMM.NNNNN（月は01〜12）、旧形式は hep-th/9901001 や math.AG/0601001
+# 旧形式は実在するアーカイブ名に限る（github.com/foo/1234567 のようなパスを拾わない。
+# 不正なIDが1件でも混ざると id_list のリクエスト全体が拒否される）
+ID_IN_TEXT_RE = re.compile(
+    r"(?<!\d)(?<!\d\.)(?P<new>[0-9]{2}(?:0[1-9]|1[0-2])\.[0-9]{4,5})(?:v[0-9]+)?(?![0-9])"
+    rf"|(?<![\w.-])(?P<old>{_OLD_ARCHIVE}(?:\.[A-Z]{{2}})?/[0-9]{{7}})(?:v[0-9]+)?(?![0-9])"
+)
+VERSION_RE = re.compile(r'v\d+$')
+
+
+def extract_arxiv_id(url):
+    """arXiv URLまたはIDから版なしのIDを抽出する（見つからなければ None）"""
+    for pattern in URL_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return VERSION_RE.sub('', match.group(1))
+    return None
+
+
+def extract_arxiv_ids(text):
+    """テキスト中のすべてのarXiv ID（版なし）を出現順・重複なしで返す"""
+    ids = []
+    seen = set()
+    for match in ID_IN_TEXT_RE.finditer(text):
+        arxiv_id = match.group("new") or match.group("old")
+        if arxiv_id not in seen:
+            seen.add(arxiv_id)
+            ids.append(arxiv_id)
+    return ids
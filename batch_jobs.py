@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_POLL_INTERVAL = 60
+DEFAULT_POLL_TIMEOUT = 24 * 3600
+
+# バックエンドが返すジョブの状態
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+
+def build_request(custom_id, model, messages, temperature):
+    """バッチ用JSONLの1行分（OpenAI Batch APIの形式）"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+        },
+    }
+
+
+def write_job_file(path, requests):
+    """リクエストをJSONLのジョブファイルに書き出す"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+
+def parse_result_line(line):
+    """結果JSONLの1行を (custom_id, 本文, エラー) に変換"""
+    record = json.loads(line)
+    custom_id = record.get("custom_id")
+    error = record.get("error")
+    response = record.get("response") or {}
+    if error or response.get("status_code", 200) != 200:
+        return custom_id, None, error or response.get("body")
+    body = response.get("body") or {}
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return custom_id, None, "no content in response"
+    return custom_id, content, None
+
+
+class BatchBackend:
+    """バッチ実行バックエンドの共通インターフェース"""
+
+    def submit(self, job_path):
+        """ジョブファイルを投入し、ジョブIDを返す"""
+        raise NotImplementedError
+
+    def status(self, job_id):
+        """STATUS_PENDING / STATUS_COMPLETED / STATUS_FAILED のいずれかを返す"""
+        raise NotImplementedError
+
+    def results(self, job_id):
+        """(custom_id, 本文, エラー) を順に返す"""
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API（試験的。openai>=1 のクライアントが必要）"""
+
+    _PENDING = {"validating", "in_progress", "finalizing", "cancelling"}
+
+    def __init__(self, client, completion_window="24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, job_path):
+        with open(job_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, job_id):
+        batch = self.client.batches.retrieve(job_id)
+        if batch.status in self._PENDING:
+            return STATUS_PENDING
+        if batch.status == "completed":
+            return STATUS_COMPLETED
+        return STATUS_FAILED
+
+    def results(self, job_id):
+        batch = self.client.batches.retrieve(job_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    yield parse_result_line(line)
+
+
+class LocalBatchBackend(BatchBackend):
+    """ジョブをローカルで順に実行するバックエンド（Batch API の割引はない）
+
+    submit でジョブをディレクトリにコピーし、最初に status を問い合わせた時点で
+    complete_fn(model, messages, temperature) を各リクエストに適用して結果ファイルを書く。
+    """
+
+    def __init__(self, work_dir, complete_fn):
+        self.work_dir = work_dir
+        self.complete_fn = complete_fn
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.work_dir, job_id)
+
+    def submit(self, job_path):
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        shutil.copyfile(job_path, os.path.join(job_dir, "input.jsonl"))
+        return job_id
+
+    def status(self, job_id):
+        job_dir = self._job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return STATUS_FAILED
+        output_path = os.path.join(job_dir, "output.jsonl")
+        if not os.path.exists(output_path):
+            self._run(job_dir, output_path)
+        return STATUS_COMPLETED
+
+    def _run(self, job_dir, output_path):
+        tmp_path = output_path + ".tmp"
+        with open(os.path.join(job_dir, "input.jsonl"), encoding="utf-8") as src, \
+                open(tmp_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                body = request["body"]
+                try:
+                    content = self.complete_fn(body["model"], body["messages"],
+                                               body.get("temperature"))
+                    record = {
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": {"choices": [{"message": {"content": content}}]},
+                        },
+                        "error": None,
+                    }
+                except Exception as e:
+                    record = {"custom_id": request["custom_id"], "response": None,
+                              "error": str(e)}
+                dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, output_path)
+
+    def results(self, job_id):
+        output_path = os.path.join(self._job_dir(job_id), "output.jsonl")
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield parse_result_line(line)
+
+
+def wait_for_job(backend, job_id, interval=DEFAULT_POLL_INTERVAL, timeout=DEFAULT_POLL_TIMEOUT):
+    """ジョブが終わるまでポーリングし、最終状態を返す"""
+    deadline = time.monotonic() + timeout
+    while True:
+        status = backend.status(job_id)
+        if status != STATUS_PENDING:
+            return status
+        if time.monotonic() >= deadline:
+            return STATUS_PENDING
+        time.sleep(interval)
+
+
+def collect_results(backend, job_id):
+    """結果を {custom_id: (本文, エラー)} にまとめる"""
+    return {custom_id: (content, error)
+            for custom_id, content, error in backend.results(job_id)}
@@ -0,0 +1,100 @@
+"""ベンチマーク用のarXiv Atomフィードを生成する（固定シードなので毎回同じ内容）
+
+    python benchmarks/make_fixtures.py
+"""
+import gzip
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_SIZES = (1, 100, 2000)
+SEED = 20240101
+
+WORDS = (
+    "transformer attention language model training data benchmark learning neural network "
+    "representation pretraining fine-tuning inference efficient scalable robust evaluation "
+    "dataset task performance method approach framework propose demonstrate results show "
+    "state-of-the-art improve reasoning retrieval generation alignment reinforcement policy "
+    "optimization gradient convergence graph vision image diffusion sampling latent encoder "
+    "decoder token sequence context window memory compression quantization distillation"
+).split()
+CATEGORIES = ["cs.CL", "cs.LG", "cs.AI", "cs.CV", "stat.ML", "cs.IR", "math.OC"]
+FIRST_NAMES = ["Alice", "Bo", "Chen", "Daniel", "Emi", "Farah", "Goro", "Hana", "Ivan", "Jun"]
+LAST_NAMES = ["Smith", "Wang", "Tanaka", "Garcia", "Kim", "Müller", "Sato", "Novak", "Li", "Rossi"]
+
+
+def _sentence(rng, low, high):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return " ".join(words).capitalize() + "."
+
+
+def _entry(rng, index, published):
+    paper_id = f"{published:%y%m}.{10000 + index:05d}v{rng.randint(1, 3)}"
+    title = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(5, 12)))
+    # 実際のフィードと同じく、タイトル・アブストラクトは途中で改行される
+    title = title.replace(" ", "\n  ", 1)
+    summary = "\n".join(_sentence(rng, 12, 25) for _ in range(rng.randint(5, 9)))
+    updated = published + timedelta(days=rng.randint(0, 30))
+    categories = rng.sample(CATEGORIES, rng.randint(1, 3))
+    authors = "".join(
+        f"<author><name>{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}</name></author>"
+        for _ in range(rng.randint(1, 8))
+    )
+    category_xml = "".join(
+        f'<category term="{c}" scheme="http://arxiv.org/schemas/atom"/>' for c in categories
+    )
+    return (
+        "<entry>"
+        f"<id>http://arxiv.org/abs/{paper_id}</id>"
+        f"<updated>{updated:%Y-%m-%dT%H:%M:%SZ}</updated>"
+        f"<published>{published:%Y-%m-%dT%H:%M:%SZ}</published>"
+        f"<title>{escape(title)}</title>"
+        f"<summary>  {escape(summary)}\n</summary>"
+        f"{authors}"
+        f'<arxiv:comment xmlns:arxiv="http://arxiv.org/schemas/atom">{rng.randint(8, 40)} pages</arxiv:comment>'
+        f'<link href="http://arxiv.org/abs/{paper_id}" rel="alternate" type="text/html"/>'
+        f'<link title="pdf" href="http://arxiv.org/pdf/{paper_id}" rel="related" type="application/pdf"/>'
+        f'<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="{categories[0]}" '
+        'scheme="http://arxiv.org/schemas/atom"/>'
+        f"{category_xml}"
+        "</entry>"
+    )
+
+
+def make_feed(size, seed=SEED):
+    """size 件のentryを持つフィード（bytes）"""
+    rng = random.Random(seed + size)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    entries = [_entry(rng, i, start - timedelta(minutes=7 * i)) for i in range(size)]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        '<link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>'
+        "<title type=\"html\">ArXiv Query: benchmark</title>"
+        f'<opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{size}'
+        "</opensearch:totalResults>"
+        '<opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">0'
+        "</opensearch:startIndex>"
+        + "".join(entries)
+        + "</feed>\n"
+    ).encode("utf-8")
+
+
+def fixture_path(size):
+    return os.path.join(FIXTURE_DIR, f"atom_{size}.xml.gz")
+
+
+def main():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for size in FIXTURE_SIZES:
+        # mtime を固定して、再生成しても同じバイト列にする
+        with open(fixture_path(size), "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write(make_feed(size))
+        print(f"{fixture_path(size)}: {os.path.getsize(fixture_path(size))} bytes")
+
+
+if __name__ == "__main__":
+    main()
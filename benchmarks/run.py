@@ -0,0 +1,300 @@
+"""検索・パース・キャッシュのホットパスのオフライン・ベンチマーク
+
+    python benchmarks/run.py                  # 計測して baselines.json と比較
+    python benchmarks/run.py --filter cache   # 名前に cache を含むものだけ
+    python benchmarks/run.py --save-baseline  # 計測結果を baselines.json に保存
+
+ネットワークには一切アクセスしない。比較で閾値を超えて遅く（または大きく）なった
+ものがあれば終了コード 1 を返す。
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from arxiv_atom import iter_entries  # noqa: E402
+from arxiv_cache import CacheStore, cache_key  # noqa: E402
+from arxiv_ids import extract_arxiv_id, extract_arxiv_ids  # noqa: E402
+from make_fixtures import FIXTURE_SIZES, fixture_path  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+DEFAULT_THRESHOLD = 0.3  # 基準値から30%以上悪化したら回帰とみなす
+URL_CORPUS_SIZE = 10000
+CACHE_SIZES = (100, 1000, 10000)
+CACHE_OPS = 200
+
+
+def load_fixture(size):
+    with gzip.open(fixture_path(size), "rb") as f:
+        return f.read()
+
+
+def url_corpus(size=URL_CORPUS_SIZE, seed=0):
+    """実際の入力に近い、形式の混ざったURL・IDの一覧"""
+    rng = random.Random(seed)
+    forms = [
+        "https://arxiv.org/abs/{new}",
+        "https://arxiv.org/abs/{new}v{v}",
+        "http://arxiv.org/pdf/{new}v{v}.pdf",
+        "https://arxiv.org/pdf/{new}.pdf",
+        "{new}",
+        "{new}v{v}",
+        "https://arxiv.org/abs/{old}",
+        "http://arxiv.org/pdf/{old}v{v}",
+        "https://example.com/papers/{new}",
+        "Attention Is All You Need",
+    ]
+    corpus = []
+    for _ in range(size):
+        new = f"{rng.randint(7, 24):02d}{rng.randint(1, 12):02d}.{rng.randint(0, 99999):05d}"
+        old = f"{rng.choice(['hep-th', 'cond-mat', 'math', 'astro-ph'])}/{rng.randint(9000000, 9999999)}"
+        corpus.append(rng.choice(forms).format(new=new, old=old, v=rng.randint(1, 9)))
+    return corpus
+
+
+def paper_record(i):
+    return {
+        'id': f"2401.{i:05d}v1",
+        'title': f"Paper number {i} about transformers",
+        'summary': "word " * 150,
+        'published': "2024-01-01T00:00:00Z",
+        'updated': "2024-01-02T00:00:00Z",
+        'authors': ["Alice Smith", "Bo Wang", "Chen Li"],
+        'categories': ["cs.CL", "cs.LG"],
+        'primary_category': "cs.CL",
+        'entry_id': f"http://arxiv.org/abs/2401.{i:05d}v1",
+        'pdf_url': f"http://arxiv.org/pdf/2401.{i:05d}v1.pdf",
+    }
+
+
+class Case:
+    """ベンチマーク1件（setup は (1回分の処理, 1回あたりの操作数, 後始末) を返す）"""
+
+    def __init__(self, name, description, setup):
+        self.name = name
+        self.description = description
+        self.setup = setup
+
+
+def _parse_case(size):
+    def setup():
+        data = load_fixture(size)
+
+        def run():
+            # 1件ずつ捨てながら読む（逐次パースでメモリが一定であることも見る）
+            count = sum(1 for _ in iter_entries(io.BytesIO(data)))
+            assert count == size
+        return run, size, None
+    return Case(f"parse_atom_{size}", f"Atomフィード {size} 件のパース（ops = entry）", setup)
+
+
+def _fetch_ids_case(size):
+    # search_by_ids（_fetch_ids）と同じく、版あり・版なしの両方で引ける辞書を作る
+    def setup():
+        data = load_fixture(size)
+
+        def run():
+            fetched = {}
+            for paper_data in iter_entries(io.BytesIO(data)):
+                fetched[paper_data['id']] = paper_data
+                fetched.setdefault(paper_data['id'].rpartition('v')[0], paper_data)
+        return run, size, None
+    return Case(f"fetch_ids_{size}", f"id_list 応答 {size} 件の取り込み（ops = entry）", setup)
+
+
+def _extract_url_case():
+    def setup():
+        corpus = url_corpus()
+
+        def run():
+            for url in corpus:
+                extract_arxiv_id(url)
+        return run, len(corpus), None
+    return Case("extract_id_urls", f"URL・ID {URL_CORPUS_SIZE} 件からのID抽出（ops = URL）", setup)
+
+
+def _extract_text_case():
+    def setup():
+        text = "\n".join(
+            f"@article{{key{i}, title={{Paper {i}}}, journal={{arXiv preprint arXiv:{url}}}}}"
+            for i, url in enumerate(url_corpus(2000, seed=1))
+        )
+
+        def run():
+            extract_arxiv_ids(text)
+        return run, 2000, None
+    return Case("extract_ids_bibtex", "BibTeX 2000 件から一括でID抽出（ops = entry）", setup)
+
+
+def _cache_store(entries):
+    directory = tempfile.mkdtemp(prefix="bench-cache-")
+    path = os.path.join(directory, "cache.sqlite3")
+    store = CacheStore(path, max_entries=entries * 2)
+    # 事前の投入は1トランザクションでまとめて行う（set() を1件ずつ呼ぶと遅い）
+    now = time.time()
+    rows = []
+    for i in range(entries):
+        blob = pickle.dumps(paper_record(i), protocol=pickle.HIGHEST_PROTOCOL)
+        rows.append((cache_key("id", f"2401.{i:05d}"), "id", blob, len(blob), now, now))
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO cache_entries "
+            "(key, namespace, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+    return store, directory
+
+
+def _cache_get_case(entries):
+    def setup():
+        store, directory = _cache_store(entries)
+        keys = [f"2401.{random.Random(i).randrange(entries):05d}" for i in range(CACHE_OPS)]
+
+        def run():
+            for key in keys:
+                assert store.get("id", key) is not None
+
+        def cleanup():
+            store.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        return run, CACHE_OPS, cleanup
+    return Case(f"cache_get_{entries}", f"{entries} 件のキャッシュからの取得（ops = get）", setup)
+
+
+def _cache_set_case(entries):
+    def setup():
+        store, directory = _cache_store(entries)
+        records = [(f"2401.{i % entries:05d}", paper_record(i)) for i in range(CACHE_OPS)]
+
+        def run():
+            for key, record in records:
+                store.set("id", key, record)
+
+        def cleanup():
+            store.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        return run, CACHE_OPS, cleanup
+    return Case(f"cache_set_{entries}", f"{entries} 件のキャッシュへの保存（ops = set）", setup)
+
+
+CASES = (
+    [_parse_case(size) for size in FIXTURE_SIZES]
+    + [_fetch_ids_case(100)]
+    + [_extract_url_case(), _extract_text_case()]
+    + [_cache_get_case(size) for size in CACHE_SIZES]
+    + [_cache_set_case(size) for size in CACHE_SIZES]
+)
+
+
+def measure(case, repeat, min_time):
+    """最良の ops/sec と、1回分の処理のピークメモリ（KiB）を返す"""
+    run, ops, cleanup = case.setup()
+    try:
+        run()  # ウォームアップ
+        best = 0.0
+        for _ in range(repeat):
+            calls = 0
+            start = time.perf_counter()
+            while True:
+                run()
+                calls += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+            best = max(best, calls * ops / elapsed)
+
+        # tracemalloc は処理を遅くするので、速度とは別に測る
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        if cleanup is not None:
+            cleanup()
+    return {"ops_per_sec": round(best, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def compare(name, result, baseline, threshold):
+    """基準値と比べて、回帰していればその内容を返す"""
+    problems = []
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - threshold):
+        problems.append(f"ops/sec {baseline['ops_per_sec']:.0f} -> {result['ops_per_sec']:.0f}")
+    # 小さな値の揺れで誤検知しないよう、64KiB未満の増加は無視する
+    if (result["peak_kib"] > baseline["peak_kib"] * (1 + threshold)
+            and result["peak_kib"] - baseline["peak_kib"] > 64):
+        problems.append(f"peak {baseline['peak_kib']:.0f}KiB -> {result['peak_kib']:.0f}KiB")
+    return problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="オフライン・ベンチマーク")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含むものだけ実行")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="1回の計測の最短秒数")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="回帰とみなす悪化の割合")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="結果を baselines.json に保存（既存の値は上書き）")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baselines = json.load(f).get("results", {})
+
+    results = {}
+    regressions = []
+    print(f"{'name':<22}{'ops/sec':>14}{'peak KiB':>12}  vs baseline")
+    for case in CASES:
+        if args.filter not in case.name:
+            continue
+        result = measure(case, args.repeat, args.min_time)
+        results[case.name] = result
+        note = ""
+        if case.name in baselines:
+            base = baselines[case.name]
+            note = f"{result['ops_per_sec'] / base['ops_per_sec'] - 1:+.0%}"
+            problems = compare(case.name, result, base, args.threshold)
+            if problems:
+                regressions.append((case.name, problems))
+                note += "  REGRESSION: " + ", ".join(problems)
+        print(f"{case.name:<22}{result['ops_per_sec']:>14,.0f}{result['peak_kib']:>12,.1f}  {note}")
+
+    if args.save_baseline:
+        merged = dict(baselines, **results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": dict(sorted(merged.items())),
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"saved {len(results)} results to {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
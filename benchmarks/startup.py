@@ -0,0 +1,119 @@
+"""起動時間のベンチマーク（毎回新しいプロセスで計測する）
+
+    python benchmarks/startup.py              # 各項目を5回ずつ計測
+    python benchmarks/startup.py --repeat 10
+
+- import_bot:      paper_summary_bot の import（設定ファイルなしで import できること）
+- bot_help:        `python paper_summary_bot.py --help` のプロセス全体
+- import_<lib>:    初回の利用まで読み込みを遅らせているクライアントライブラリの import
+- app_first_render: Streamlit の AppTest でアプリを1回描画するまで（streamlit がある場合のみ）
+
+ネットワークにはアクセスしない。アプリの描画はダミーのシークレットを使い、
+一時ディレクトリで実行するためリポジトリにキャッシュを作らない。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(REPO_DIR, "paper_summary_streamlitapp.py")
+BOT_PATH = os.path.join(REPO_DIR, "paper_summary_bot.py")
+DEFERRED_LIBRARIES = ("openai", "slack_sdk", "notion_client")
+
+_TIMED_IMPORT = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+_FIRST_RENDER = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file({path!r}, default_timeout=60)
+for section in ("gptApiKey", "SlackApiKey", "NotionApiKey", "NotionDatabaseUrl"):
+    app.secrets[section] = {{"key": "dummy"}}
+app.run()
+done = time.perf_counter()
+errors = [str(e.value) for e in app.exception]
+print(json.dumps({{"seconds": done - imported, "streamlit_import": imported - start,
+                  "errors": errors}}))
+"""
+
+
+def run_python(code, cwd):
+    """新しいプロセスでコードを実行し、最後の行のJSONを返す"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    output = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wall_time(args, cwd):
+    """コマンド全体の所要秒数"""
+    code = (
+        "import subprocess, sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"subprocess.run({args!r}, check=True, capture_output=True)\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start}))\n"
+    )
+    return run_python(code, cwd)
+
+
+def is_installed(module):
+    code = f"import importlib.util; print(importlib.util.find_spec({module!r}) is not None)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout
+    return output.strip() == "True"
+
+
+def cases():
+    """(名前, 1回分の計測) の一覧"""
+    yield "import_bot", lambda cwd: run_python(
+        _TIMED_IMPORT.format(repo=REPO_DIR, module="paper_summary_bot"), cwd)
+    yield "bot_help", lambda cwd: wall_time([sys.executable, BOT_PATH, "--help"], cwd)
+    for library in DEFERRED_LIBRARIES:
+        if is_installed(library):
+            yield f"import_{library}", lambda cwd, library=library: run_python(
+                _TIMED_IMPORT.format(repo=REPO_DIR, module=library), cwd)
+        else:
+            print(f"skip import_{library}: {library} is not installed")
+    if is_installed("streamlit"):
+        yield "app_first_render", lambda cwd: run_python(_FIRST_RENDER.format(path=APP_PATH), cwd)
+    else:
+        print("skip app_first_render: streamlit is not installed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'name':<22}{'median ms':>12}{'min ms':>10}")
+    for name, measure in cases():
+        samples = []
+        for _ in range(args.repeat):
+            # キャッシュやログを残さないよう、毎回空のディレクトリで実行する
+            cwd = tempfile.mkdtemp(prefix="bench-startup-")
+            try:
+                result = measure(cwd)
+            finally:
+                shutil.rmtree(cwd, ignore_errors=True)
+            if result.get("errors"):
+                print(f"{name}: app raised {result['errors'][0]}")
+                return 1
+            samples.append(result["seconds"] * 1000)
+        print(f"{name:<22}{statistics.median(samples):>12,.1f}{min(samples):>10,.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
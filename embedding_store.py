@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EMBEDDING_STORE_DIR = "embeddings"
+SEARCH_CHUNK_ROWS = 65536  # 検索時に一度に読む行数
+
+_VERSION_RE = re.compile(r"v\d+$")
+
+
+def _lock(lock_file):
+    """ロックファイルの排他ロックを取る（取れるまで待つ）"""
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            # LK_LOCK は10回まで再試行して OSError を送出するので、取れるまで繰り返す
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingStore:
+    """追記専用・メモリマップの埋め込み行列
+
+    vectors.f32 に float32 の行を追記し、ids.txt に同じ順で論文IDを書く。
+    どのワーカーもファイルをメモリマップで開くだけなので、全体をRAMに載せない。
+    ベクトルを書いてからIDを書くため、読み手はIDの数だけ行を読めば
+    書きかけの行を見ることはない。
+    """
+
+    def __init__(self, directory, dim, embedder_name):
+        self.directory = directory
+        self.dim = dim
+        self.embedder_name = embedder_name
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "ids.txt")
+        self._lock_path = os.path.join(directory, "append.lock")
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._matrix = None
+        self._check_meta()
+        self.refresh()
+
+    def _check_meta(self):
+        meta_path = os.path.join(self.directory, "meta.json")
+        meta = {"dim": self.dim, "embedder": self.embedder_name}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError(f"embedding store {self.directory} was built with {existing}")
+        else:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, paper_id):
+        return _VERSION_RE.sub('', paper_id) in self._rows
+
+    def refresh(self):
+        """他のワーカーが追記した分を取り込む"""
+        with self._lock:
+            if not os.path.exists(self._ids_path):
+                return
+            with open(self._ids_path, encoding="utf-8") as f:
+                content = f.read()
+            # 書きかけの最終行は無視する
+            ids = content[:content.rfind("\n") + 1].splitlines()
+            if len(ids) == len(self._ids):
+                return
+            for row in range(len(self._ids), len(ids)):
+                self._rows.setdefault(ids[row], row)
+            self._ids = ids
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                     shape=(len(ids), self.dim))
+
+    def add(self, paper_ids, vectors):
+        """未登録の論文だけを追記する（ベクトルは正規化して保存）"""
+        self.refresh()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        new_ids, new_rows, queued = [], [], set()
+        for paper_id, vector in zip(paper_ids, vectors):
+            base_id = _VERSION_RE.sub('', paper_id)
+            if base_id in self._rows or base_id in queued:
+                continue
+            queued.add(base_id)
+            new_ids.append(base_id)
+            new_rows.append(vector)
+        if not new_ids:
+            return 0
+
+        # 複数プロセスからの追記をファイルロックで直列化する
+        with open(self._lock_path, "w") as lock_file:
+            _lock(lock_file)
+            try:
+                self.refresh()
+                pending = [(i, r) for i, r in zip(new_ids, new_rows) if i not in self._rows]
+                if not pending:
+                    return 0
+                # 書きかけの行が残っていれば切り詰めてから追記する
+                expected = len(self._ids) * self.dim * 4
+                with open(self._vectors_path, "ab") as f:
+                    if f.tell() != expected:
+                        f.truncate(expected)
+                    f.write(np.vstack([r for _, r in pending]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self._ids_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{i}\n" for i, _ in pending))
+            finally:
+                _unlock(lock_file)
+        self.refresh()
+        return len(pending)
+
+    def vector(self, paper_id):
+        row = self._rows.get(_VERSION_RE.sub('', paper_id))
+        return None if row is None else np.array(self._matrix[row])
+
+    def search(self, vector, k=10, exclude=()):
+        """コサイン類似度の高い順に [(論文ID, 類似度), ...] を返す"""
+        self.refresh()
+        if self._matrix is None or not len(self._ids):
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        excluded = {_VERSION_RE.sub('', paper_id) for paper_id in exclude}
+        wanted = k + len(excluded)
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self._ids), SEARCH_CHUNK_ROWS):
+            scores = self._matrix[start:start + SEARCH_CHUNK_ROWS] @ query
+            if len(scores) > wanted:
+                top = np.argpartition(-scores, wanted - 1)[:wanted]
+            else:
+                top = np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_rows) > wanted:
+                keep = np.argpartition(-best_scores, wanted - 1)[:wanted]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores, kind="stable")
+        results = []
+        for i in order:
+            paper_id = self._ids[best_rows[i]]
+            if paper_id in excluded:
+                continue
+            results.append((paper_id, float(best_scores[i])))
+            if len(results) >= k:
+                break
+        return results
+
+
+def open_embedding_store(cache_dir, embedder):
+    """cache_dir 配下に埋め込み方式ごとのストアを開く"""
+    directory = os.path.join(cache_dir, EMBEDDING_STORE_DIR, embedder.name)
+    return EmbeddingStore(directory, embedder.dim, embedder.name)
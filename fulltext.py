@@ -0,0 +1,150 @@
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from model_router import count_tokens
+
+CHUNK_TOKENS = 3000        # 1チャンクの最大トークン数
+MIN_CHUNK_TOKENS = 400     # 見出しで区切るときに最低限ためるトークン数
+MAP_CONCURRENCY = 4
+
+MAP_PROMPT = """以下は論文本文の一部です。後で論文全体の要約に統合するため、
+この部分に書かれている課題設定・手法・実験結果・限界を、日本語の箇条書きで簡潔にまとめてください。
+数値や固有名詞は省略せずに残してください。"""
+
+# "3 Method", "3.2 Results", "IV. EXPERIMENTS", "Introduction" などの見出し行
+_HEADING_RE = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.)\s+[A-Z][^\n]{0,80}"
+    r"|(?:Abstract|Introduction|Related Work|Background|Method(?:s|ology)?|Experiments?"
+    r"|Results|Discussion|Conclusions?|Limitations)\s*)$"
+)
+_END_HEADING_RE = re.compile(r"^(?:\d+\.?\s+)?(?:References|Bibliography|Acknowledg(?:e)?ments?)\s*$",
+                             re.IGNORECASE)
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+
+
+def iter_page_texts(file):
+    """(ページ番号, テキスト) をページごとに返す（pypdf が必要）"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("全文モードには pypdf が必要です（pip install pypdf）")
+    reader = PdfReader(file)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, _HYPHEN_BREAK_RE.sub(r"\1\2", page.extract_text() or "")
+
+
+class Chunk:
+    """本文の一区切り（見出しとページ範囲つき）"""
+
+    def __init__(self, index, first_page, last_page, heading, text):
+        self.index = index
+        self.first_page = first_page
+        self.last_page = last_page
+        self.heading = heading
+        self.text = text
+
+    def label(self):
+        pages = (f"p.{self.first_page}" if self.first_page == self.last_page
+                 else f"p.{self.first_page}-{self.last_page}")
+        return f"{pages} {self.heading}".strip()
+
+
+def iter_chunks(pages, model, max_tokens=CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS):
+    """ページのテキストを見出し・トークン数で区切ったチャンクを順に返す
+
+    参考文献・謝辞の見出しに達したらそこで止める。
+    """
+    index = 0
+    lines, tokens = [], 0
+    heading, first_page, last_page = "", None, None
+
+    def flush():
+        nonlocal index, lines, tokens, first_page
+        chunk = Chunk(index, first_page, last_page, heading, "\n".join(lines))
+        index += 1
+        lines, tokens, first_page = [], 0, None
+        return chunk
+
+    for page, text in pages:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if _END_HEADING_RE.match(line):
+                if lines:
+                    yield flush()
+                return
+            if _HEADING_RE.match(line) and tokens >= min_tokens:
+                yield flush()
+                heading = line
+            elif _HEADING_RE.match(line) and not lines:
+                heading = line
+            line_tokens = count_tokens(line, model)
+            if tokens + line_tokens > max_tokens and lines:
+                yield flush()
+            if first_page is None:
+                first_page = page
+            last_page = page
+            lines.append(line)
+            tokens += line_tokens
+    if lines:
+        yield flush()
+
+
+class ChunkSummary:
+    """チャンクの要約結果と所要時間"""
+
+    def __init__(self, chunk, summary, latency, error=None):
+        self.chunk = chunk
+        self.summary = summary
+        self.latency = latency
+        self.error = error
+
+
+def _summarize_chunk(summarize, chunk):
+    start = time.perf_counter()
+    try:
+        summary, error = summarize(chunk.text), None
+    except Exception as e:
+        summary, error = None, str(e)
+    # 要約が済んだ本文は手放す
+    chunk.text = None
+    return ChunkSummary(chunk, summary, time.perf_counter() - start, error)
+
+
+def map_chunks(chunks, summarize, concurrency=MAP_CONCURRENCY):
+    """チャンクを並列に要約し、終わった順に ChunkSummary を返す
+
+    同時に処理中のチャンクは concurrency 個までで、次のチャンクは
+    1つ終わるたびに読み進めるため、論文が長くてもメモリ使用量は一定。
+    """
+    chunks = iter(chunks)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = set()
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.add(executor.submit(_summarize_chunk, summarize, chunk))
+
+    try:
+        for _ in range(concurrency):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
+                submit_next()
+    finally:
+        # 途中で打ち切られた場合は未着手のチャンクを捨てる
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_reduce_text(paper, partials):
+    """チャンクごとの要約をまとめて、最終要約の入力にする"""
+    sections = [f"[{p.chunk.label()}]\n{p.summary}" for p in partials if p.summary]
+    return (f"title: {paper['title']}\n"
+            f"abstract: {paper['summary']}\n\n"
+            "本文（セクションごとの要約）:\n\n" + "\n\n".join(sections))
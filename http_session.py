@@ -0,0 +1,141 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_POOL_CONNECTIONS = 4   # ホストごとに保持するプール数
+DEFAULT_POOL_MAXSIZE = 8       # 1プールあたりの最大コネクション数
+
+
+class HttpStats:
+    """HTTP通信の累計カウンタ（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0   # 圧縮されたままの転送バイト数
+        self.bytes_decoded = 0    # 展開後のバイト数
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_bytes(self, received, decoded):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+
+
+class CountingStream:
+    """レスポンス本体を読みながら転送量を数えるファイルライクオブジェクト"""
+
+    def __init__(self, response, stats):
+        self._response = response
+        self._raw = response.raw
+        self._stats = stats
+        self._decoded = 0
+        self._closed = False
+
+    @property
+    def status_code(self):
+        return self._response.status_code
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    def read(self, size=-1):
+        data = self._raw.read(size if size is not None and size >= 0 else None)
+        self._decoded += len(data)
+        return data
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            received = self._raw.tell()
+        except Exception:
+            received = self._decoded
+        self._stats.record_bytes(received, self._decoded)
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PooledHttpSession:
+    """keep-alive・gzip対応のコネクションプール付きHTTPセッション
+
+    API群のキャッシュ（st.cache_resource）と同じ寿命で使い回し、
+    TCP/TLSのハンドシェイクを減らす。
+    """
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 user_agent="arxiv-summarize-bot"):
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = HttpStats()
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "User-Agent": user_agent,
+        })
+
+    def get(self, url, **kwargs):
+        """通常のGET（本体はすべて読み込む）"""
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.get(url, **kwargs)
+        self.stats.record_request()
+        try:
+            received = response.raw.tell()
+        except Exception:
+            received = len(response.content)
+        self.stats.record_bytes(received, len(response.content))
+        return response
+
+    def get_stream(self, url, **kwargs):
+        """本体をストリームで読むGET（展開済みのバイト列を返す CountingStream）"""
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.get(url, stream=True, **kwargs)
+        self.stats.record_request()
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        response.raw.decode_content = True
+        return CountingStream(response, self.stats)
+
+    def connection_stats(self):
+        """新規接続数・リクエスト数・転送量をまとめて返す"""
+        new_connections = 0
+        pool_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+
+        stats = self.stats
+        return {
+            "requests": stats.requests,
+            "new_connections": new_connections,
+            "reused_connections": max(0, pool_requests - new_connections),
+            "bytes_received": stats.bytes_received,
+            "bytes_decoded": stats.bytes_decoded,
+        }
+
+    def close(self):
+        self.session.close()
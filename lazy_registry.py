@@ -0,0 +1,30 @@
+import threading
+
+
+class LazyRegistry(dict):
+    """初めて参照されたときに factory を呼んで値を作る辞書
+
+    APIクライアントのように作るのが重く、使わないこともあるものを
+    起動時ではなく最初に使う時点で作るために使う。factory の中から
+    別のキーを参照してもよい。作った値はそのまま辞書に残る。
+    """
+
+    def __init__(self, factories, **values):
+        super().__init__(values)
+        self._factories = factories
+        self._lock = threading.RLock()
+
+    def __missing__(self, key):
+        if key not in self._factories:
+            raise KeyError(key)
+        with self._lock:
+            # 待っている間に他のスレッドが作っていればそれを使う
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+            value = self._factories[key]()
+            self[key] = value
+            return value
+
+    def built(self, key):
+        """key の値がすでに作られているか"""
+        return dict.__contains__(self, key)
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ROUTING_LOG_NAME = "routing_log.jsonl"
+
+TIER_FAST = 1      # 短い要約なら十分
+TIER_STANDARD = 2  # 通常の論文要約
+TIER_REASONING = 3  # 推論モデル
+
+DEFAULT_MIN_TIER = TIER_STANDARD
+DEFAULT_LATENCY_SLO = 30.0  # 秒
+OUTPUT_TOKENS_PER_ITEM = 150  # 出力フォーマットの1項目あたりの見込みトークン数
+OUTPUT_TOKENS_BASE = 100
+OUTPUT_HEADROOM = 1.5  # max_tokens は見込みの何倍まで許すか
+MIN_MAX_TOKENS = 2000  # 見込みより長い日本語の要約でも途中で切れないように
+MIN_TEXT_TOKENS = 256  # プロンプトを削ってでも本文に残すトークン数
+MESSAGE_OVERHEAD = 12  # チャット形式のメッセージ2件分の付加トークン
+
+_FORMAT_ITEM_RE = re.compile(r"^\s*[・\-*•]|^\s*\d+[.)．]", re.MULTILINE)
+_SENTENCE_END_RE = re.compile(r"(?<=[。．.!?！？])\s*")
+
+
+class ModelSpec:
+    """ルーティングに使うモデルの性能・価格の目安"""
+
+    def __init__(self, model_id, tier, context_window, max_output, input_cost, output_cost,
+                 tokens_per_second, first_token_latency, token_param="max_tokens",
+                 reasoning_tokens=0, fixed_temperature=False):
+        self.model_id = model_id
+        self.tier = tier
+        self.context_window = context_window
+        self.max_output = max_output
+        self.input_cost = input_cost    # 入力100万トークンあたりのドル
+        self.output_cost = output_cost  # 出力100万トークンあたりのドル
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.token_param = token_param
+        self.reasoning_tokens = reasoning_tokens  # 推論モデルが出力上限から消費する分の見込み
+        self.fixed_temperature = fixed_temperature  # temperature を指定できない（既定値のみ）
+
+    def estimate_latency(self, input_tokens, output_tokens):
+        # 入力の処理時間は出力に比べて小さいので粗く見積もる
+        return (self.first_token_latency + input_tokens / 20000
+                + (output_tokens + self.reasoning_tokens) / self.tokens_per_second)
+
+    def estimate_cost(self, input_tokens, output_tokens):
+        return (input_tokens * self.input_cost
+                + (output_tokens + self.reasoning_tokens) * self.output_cost) / 1_000_000
+
+
+# 数値は公開価格と実測の目安。routing_log.jsonl を見ながら調整する
+MODEL_TABLE = {
+    spec.model_id: spec for spec in [
+        ModelSpec("gpt-4.1-nano-2025-04-14", TIER_FAST, 1_047_576, 32_768, 0.10, 0.40, 150, 0.4),
+        ModelSpec("gpt-4o-2024-08-06", TIER_STANDARD, 128_000, 16_384, 2.50, 10.00, 80, 0.6),
+        ModelSpec("gpt-4.1-2025-04-14", TIER_STANDARD, 1_047_576, 32_768, 2.00, 8.00, 75, 0.6),
+        ModelSpec("o3-2025-04-16", TIER_REASONING, 200_000, 100_000, 2.00, 8.00, 50, 2.0,
+                  token_param="max_completion_tokens", reasoning_tokens=4000,
+                  fixed_temperature=True),
+    ]
+}
+
+
+def _load_encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # 未知のモデルは最近のモデルと同じエンコーディングとみなす
+        return tiktoken.get_encoding("o200k_base")
+
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def count_tokens(text, model):
+    """テキストのトークン数（tiktoken がなければ文字種からの概算）"""
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _load_encoding(model)
+        encoding = _encodings[model]
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 英数字はおよそ4文字で1トークン、日本語などはおよそ1文字で1トークン
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def estimate_output_tokens(prompt):
+    """プロンプトの出力フォーマットの項目数から出力トークン数を見込む"""
+    items = len(_FORMAT_ITEM_RE.findall(prompt))
+    return OUTPUT_TOKENS_BASE + max(items, 3) * OUTPUT_TOKENS_PER_ITEM
+
+
+def trim_to_tokens(text, max_tokens, model):
+    """max_tokens に収まるよう末尾を削る（できるだけ文の区切りで切る）"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    # 収まる最長の文字数を二分探索する
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle] + "…", model) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    head = text[:low]
+    boundaries = [m.start() for m in _SENTENCE_END_RE.finditer(head) if m.start() > 0]
+    if boundaries and boundaries[-1] >= low // 2:
+        head = head[:boundaries[-1]]
+    return head.rstrip() + "…"
+
+
+class Route:
+    """ルーティングの結果"""
+
+    def __init__(self, spec, reason, input_tokens, output_tokens, max_tokens, trimmed,
+                 min_tier=None, latency_slo=None):
+        self.spec = spec
+        self.model = spec.model_id
+        self.reason = reason
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.max_tokens = max_tokens
+        self.trimmed = trimmed
+        self.min_tier = min_tier
+        self.latency_slo = latency_slo
+        self.estimated_latency = spec.estimate_latency(input_tokens, output_tokens)
+        self.estimated_cost = spec.estimate_cost(input_tokens, output_tokens)
+
+    def token_limit(self):
+        """API呼び出しに渡す出力上限の引数"""
+        return {self.spec.token_param: self.max_tokens}
+
+    def request_params(self, temperature):
+        """API呼び出しに渡す出力上限と temperature の引数（指定できないモデルには temperature を渡さない）"""
+        params = self.token_limit()
+        if not self.spec.fixed_temperature:
+            params["temperature"] = temperature
+        return params
+
+    def as_dict(self):
+        return {
+            "model": self.model,
+            "reason": self.reason,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "max_tokens": self.max_tokens,
+            "trimmed": self.trimmed,
+            "estimated_latency": round(self.estimated_latency, 2),
+            "estimated_cost": round(self.estimated_cost, 6),
+        }
+
+
+class ModelRouter:
+    """入力トークン数と出力の見込みからモデルを選び、入力を予算内に収める
+
+    モデルが明示されればそれを使う。自動選択では品質の段階が min_tier 以上で、
+    見込みの応答時間が latency_slo 以内のモデルのうち objective
+    （"latency" なら最速、"cost" なら最安）で最良のものを選ぶ。
+    SLO を満たすモデルがなければ、段階を満たす中で最速のものにする。
+    """
+
+    def __init__(self, models=None, min_tier=DEFAULT_MIN_TIER, latency_slo=DEFAULT_LATENCY_SLO,
+                 objective="latency", input_budget=None, log_path=None):
+        self.models = models if models is not None else MODEL_TABLE
+        self.min_tier = min_tier
+        self.latency_slo = latency_slo
+        self.objective = objective
+        self.input_budget = input_budget
+        self.log_path = log_path
+        self._lock = threading.Lock()
+
+    def _spec(self, model):
+        if model in self.models:
+            return self.models[model]
+        # 表にないモデルは標準的な性能とみなす
+        return ModelSpec(model, TIER_STANDARD, 128_000, 16_384, 0.0, 0.0, 60, 1.0)
+
+    def _choose(self, input_tokens, output_tokens, min_tier, latency_slo):
+        qualified = [spec for spec in self.models.values()
+                     if spec.tier >= min_tier
+                     and input_tokens + output_tokens <= spec.context_window]
+        if not qualified:
+            raise ValueError(f"no model with tier >= {min_tier} fits {input_tokens} tokens")
+        within_slo = [spec for spec in qualified
+                      if spec.estimate_latency(input_tokens, output_tokens) <= latency_slo]
+        if not within_slo:
+            spec = min(qualified, key=lambda s: s.estimate_latency(input_tokens, output_tokens))
+            return spec, "fastest (no model meets SLO)"
+        if self.objective == "cost":
+            spec = min(within_slo, key=lambda s: (s.estimate_cost(input_tokens, output_tokens),
+                                                  s.estimate_latency(input_tokens, output_tokens)))
+            return spec, "cheapest within SLO"
+        spec = min(within_slo, key=lambda s: (s.estimate_latency(input_tokens, output_tokens),
+                                              s.estimate_cost(input_tokens, output_tokens)))
+        return spec, "fastest within SLO"
+
+    def route(self, prompt, text, model=None, min_tier=None, latency_slo=None, record=True):
+        """(Route, プロンプト, 本文) を返す（必要なら本文・プロンプトを削る）
+
+        min_tier・latency_slo を渡すとその呼び出しだけ方針を上書きする。
+        record=False なら記録せず、実際に呼び出すときに record_route で記録する。
+        """
+        min_tier = self.min_tier if min_tier is None else min_tier
+        latency_slo = self.latency_slo if latency_slo is None else latency_slo
+        output_tokens = estimate_output_tokens(prompt)
+        # 選択前のトークン数は標準的なエンコーディングで数える
+        counting_model = model or next(iter(self.models))
+        input_tokens = (count_tokens(prompt, counting_model) + count_tokens(text, counting_model)
+                        + MESSAGE_OVERHEAD)
+        if model is not None:
+            spec, reason = self._spec(model), "user choice"
+        else:
+            spec, reason = self._choose(input_tokens, output_tokens, min_tier, latency_slo)
+
+        max_tokens = min(spec.max_output, spec.reasoning_tokens
+                         + max(MIN_MAX_TOKENS, int(output_tokens * OUTPUT_HEADROOM)))
+        budget = spec.context_window - max_tokens - MESSAGE_OVERHEAD
+        if self.input_budget is not None:
+            budget = min(budget, self.input_budget - MESSAGE_OVERHEAD)
+
+        prompt_tokens = count_tokens(prompt, spec.model_id)
+        text_tokens = count_tokens(text, spec.model_id)
+        trimmed = []
+        if prompt_tokens + text_tokens > budget:
+            # まず本文を削り、それでも足りなければプロンプトも削る
+            if budget - prompt_tokens < MIN_TEXT_TOKENS:
+                prompt = trim_to_tokens(prompt, max(budget - MIN_TEXT_TOKENS, 0), spec.model_id)
+                prompt_tokens = count_tokens(prompt, spec.model_id)
+                trimmed.append("prompt")
+            text = trim_to_tokens(text, budget - prompt_tokens, spec.model_id)
+            text_tokens = count_tokens(text, spec.model_id)
+            trimmed.append("text")
+
+        route = Route(spec, reason, prompt_tokens + text_tokens + MESSAGE_OVERHEAD,
+                      output_tokens, max_tokens, trimmed, min_tier, latency_slo)
+        if record:
+            self.record_route(route)
+        return route, prompt, text
+
+    def record_route(self, route):
+        """ルーティングの結果をログに残す"""
+        record = dict(route.as_dict(), time=time.time(), min_tier=route.min_tier,
+                      latency_slo=route.latency_slo, objective=self.objective)
+        logger.info("routed to %s (%s): input=%d output~%d max_tokens=%d trimmed=%s",
+                    route.model, route.reason, route.input_tokens, route.output_tokens,
+                    route.max_tokens, ",".join(route.trimmed) or "-")
+        if self.log_path is not None:
+            self._append(record)
+
+    def record_usage(self, route, output_text, latency):
+        """実際の出力トークン数と所要時間を記録する（見込みとの比較用）"""
+        actual = count_tokens(output_text or "", route.model)
+        logger.info("completed %s: output=%d (estimated %d) in %.1fs",
+                    route.model, actual, route.output_tokens, latency)
+        if self.log_path is None:
+            return
+        record = {"time": time.time(), "model": route.model, "actual_output_tokens": actual,
+                  "estimated_output_tokens": route.output_tokens, "latency": round(latency, 2)}
+        self._append(record)
+
+    def _append(self, record):
+        with self._lock:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def open_router(cache_dir, **kwargs):
+    """cache_dir 配下にルーティングのログを書くルーターを作る"""
+    return ModelRouter(log_path=os.path.join(cache_dir, ROUTING_LOG_NAME), **kwargs)
@@ -0,0 +1,249 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+NOTION_TEXT_LIMIT = 2000       # rich_text 1要素あたりの最大文字数
+NOTION_BLOCKS_PER_REQUEST = 100  # 1回の追加で送れる最大ブロック数
+NOTION_MAX_RETRIES = 5
+NOTION_BASE_DELAY = 1.0
+NOTION_INDEX_DB_NAME = "notion_pages.sqlite3"
+
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+
+
+def chunk_text(text, limit=NOTION_TEXT_LIMIT):
+    """テキストを limit 文字以下の断片に分割（段落・行の区切りを優先）"""
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            # 1行が長すぎる場合は強制的に切る
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip()]
+
+
+def paragraph_blocks(text):
+    """テキストを必要な数の段落ブロックに変換"""
+    return [
+        {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": [{"type": "text", "text": {"content": chunk}}]
+            }
+        }
+        for chunk in chunk_text(text)
+    ]
+
+
+def is_retryable(error):
+    # notion_client の読み込みは重いので、エラーが起きたときだけ行う
+    from notion_client.errors import HTTPResponseError, RequestTimeoutError
+    if isinstance(error, RequestTimeoutError):
+        return True
+    return isinstance(error, HTTPResponseError) and error.status in RETRYABLE_STATUS
+
+
+def retry_delay(error, attempt, base_delay=NOTION_BASE_DELAY):
+    """Retry-After があればそれを、なければジッタ付き指数バックオフの秒数を返す"""
+    retry_after = None
+    headers = getattr(error, "headers", None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+    return retry_after or random.uniform(0, base_delay * 2 ** attempt)
+
+
+def with_retry(fn, *args, max_retries=NOTION_MAX_RETRIES, base_delay=NOTION_BASE_DELAY, **kwargs):
+    """レート制限・一時的なエラーをジッタ付き指数バックオフで再試行（冪等な呼び出し用）"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            time.sleep(retry_delay(e, attempt, base_delay))
+
+
+class PageIndex:
+    """論文URL → NotionページIDのローカルインデックス"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS notion_pages (
+                database_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (database_id, url)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, database_id, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_id FROM notion_pages WHERE database_id = ? AND url = ?",
+                (database_id, url),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, database_id, url, page_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO notion_pages (database_id, url, page_id, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (database_id, url, page_id, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, database_id, url):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM notion_pages WHERE database_id = ? AND url = ?", (database_id, url)
+            )
+            self._conn.commit()
+
+
+class NotionWriter:
+    """要約を分割してNotionに書き込む
+
+    同じURLのページが既にあれば（ローカルインデックス → データベース検索の順で確認）
+    新規作成せず、プロパティと本文を置き換える。
+    """
+
+    def __init__(self, client, database_id, index):
+        self.client = client
+        self.database_id = database_id
+        self.index = index
+
+    def _properties(self, summary_data):
+        return {
+            "Name": {
+                "title": [{"text": {"content": summary_data["title"][:NOTION_TEXT_LIMIT]}}]
+            },
+            "Tags": {"multi_select": [{"name": "arXiv"}]},
+            "Published": {"date": {"start": summary_data["date"]}},
+            "URL": {"url": summary_data["url"]},
+        }
+
+    def find_page(self, url):
+        """URLに対応する既存ページのIDを返す（なければ None）"""
+        page_id = self.index.get(self.database_id, url)
+        if page_id:
+            return page_id
+        return self._query_page(url)
+
+    def _query_page(self, url):
+        """データベースを検索して、URLに対応するページのIDを返す（なければ None）"""
+        response = with_retry(
+            self.client.databases.query,
+            database_id=self.database_id,
+            filter={"property": "URL", "url": {"equals": url}},
+            page_size=1,
+        )
+        for page in response.get("results", []):
+            if not page.get("archived"):
+                self.index.set(self.database_id, url, page["id"])
+                return page["id"]
+        return None
+
+    def append_blocks(self, page_id, blocks):
+        """ブロックを上限件数ずつまとめて追加"""
+        for start in range(0, len(blocks), NOTION_BLOCKS_PER_REQUEST):
+            with_retry(
+                self.client.blocks.children.append,
+                block_id=page_id,
+                children=blocks[start:start + NOTION_BLOCKS_PER_REQUEST],
+            )
+
+    def clear_children(self, page_id):
+        """ページ直下のブロックをすべて削除"""
+        block_ids = []
+        cursor = None
+        while True:
+            kwargs = {"block_id": page_id, "page_size": 100}
+            if cursor:
+                kwargs["start_cursor"] = cursor
+            response = with_retry(self.client.blocks.children.list, **kwargs)
+            block_ids.extend(block["id"] for block in response.get("results", []))
+            if not response.get("has_more"):
+                break
+            cursor = response.get("next_cursor")
+        for block_id in block_ids:
+            with_retry(self.client.blocks.delete, block_id=block_id)
+
+    def save(self, summary_data):
+        """要約を保存し、(ページID, 新規作成したか) を返す"""
+        from notion_client.errors import HTTPResponseError
+        url = summary_data["url"]
+        blocks = paragraph_blocks(summary_data["summary"])
+
+        page_id = self.find_page(url)
+        if page_id:
+            try:
+                with_retry(self.client.pages.update, page_id=page_id,
+                           properties=self._properties(summary_data))
+            except HTTPResponseError as e:
+                if e.status != 404:
+                    raise
+                # ページが削除済みならインデックスを消して作り直す
+                self.index.delete(self.database_id, url)
+                page_id = None
+            else:
+                self.clear_children(page_id)
+                self.append_blocks(page_id, blocks)
+                return page_id, False
+
+        first, rest = blocks[:NOTION_BLOCKS_PER_REQUEST], blocks[NOTION_BLOCKS_PER_REQUEST:]
+        page_id = self._create_page(url, self._properties(summary_data), first)
+        self.index.set(self.database_id, url, page_id)
+        self.append_blocks(page_id, rest)
+        return page_id, True
+
+    def _create_page(self, url, properties, children, max_retries=NOTION_MAX_RETRIES):
+        """ページを作成してIDを返す
+
+        タイムアウトや 409・5xx ではサーバー側で作成済みのことがあるため、
+        再試行する前にデータベースを検索し、あればそのページを使う。
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                page = self.client.pages.create(
+                    parent={"database_id": self.database_id},
+                    properties=properties,
+                    children=children,
+                )
+                return page["id"]
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    raise
+                time.sleep(retry_delay(e, attempt))
+            page_id = self._query_page(url)
+            if page_id:
+                return page_id
+
+
+def open_page_index(cache_dir):
+    """cache_dir 配下のページインデックスを開く"""
+    return PageIndex(os.path.join(cache_dir, NOTION_INDEX_DB_NAME))
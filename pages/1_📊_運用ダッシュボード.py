@@ -0,0 +1,94 @@
+"""全セッションをまたいだ処理段階ごとの所要時間・カウンタを表示する運用向けページ"""
+import datetime
+
+import streamlit as st
+
+from telemetry import get_telemetry
+
+st.set_page_config(page_title="📊 運用ダッシュボード", page_icon="📊", layout="wide")
+
+STAGE_LABELS = {
+    "cache_lookup": "キャッシュ参照",
+    "arxiv_fetch": "arXiv取得",
+    "xml_parse": "XMLパース",
+    "llm_call": "LLM呼び出し",
+    "slack_post": "Slack投稿",
+    "notion_save": "Notion保存",
+}
+
+
+def milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def stage_rows(stages):
+    """処理段階ごとの統計を表の行にする"""
+    return [{
+        "段階": STAGE_LABELS.get(stage, stage),
+        "件数": stats["count"],
+        "エラー": stats["errors"],
+        "p50 (ms)": milliseconds(stats["p50"]),
+        "p95 (ms)": milliseconds(stats["p95"]),
+        "平均 (ms)": milliseconds(stats["mean"]),
+        "最大 (ms)": milliseconds(stats["max"]),
+    } for stage, stats in stages.items()]
+
+
+def counter_value(counters, name, **labels):
+    return sum(c["value"] for c in counters
+               if c["name"] == name and all(c["labels"].get(k) == v for k, v in labels.items()))
+
+
+def main():
+    telemetry = get_telemetry()
+    snapshot = telemetry.snapshot()
+    stages, counters = snapshot["stages"], snapshot["counters"]
+
+    st.title("📊 運用ダッシュボード")
+    started = datetime.datetime.fromtimestamp(snapshot["started_at"])
+    st.caption(f"このプロセスの起動 {started:%Y-%m-%d %H:%M:%S} 以降、全セッションの集計です。"
+               "p50 / p95 は段階ごとの直近のサンプルから計算しています。")
+    if st.button("🔄 更新"):
+        st.rerun()
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("検索", counter_value(counters, "searches"))
+    col2.metric("エラー", counter_value(counters, "errors"))
+    lookups = counter_value(counters, "cache_lookups")
+    hits = counter_value(counters, "cache_lookups", result="hit")
+    col3.metric("キャッシュヒット率", f"{hits / lookups:.0%}" if lookups else "-")
+    col4.metric("LLMトークン", f"{counter_value(counters, 'llm_tokens'):,}")
+
+    st.markdown("### ⏱️ 処理段階ごとの所要時間")
+    if stages:
+        rows = stage_rows(stages)
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.bar_chart({row["段階"]: row["p95 (ms)"] for row in rows})
+    else:
+        st.info("まだ計測値がありません。メインページで論文を検索すると集計されます。")
+
+    st.markdown("### 🤖 モデルごとのトークン使用量")
+    models = sorted({c["labels"]["model"] for c in counters if c["name"] == "llm_tokens"})
+    if models:
+        st.dataframe([{
+            "モデル": model,
+            "呼び出し": counter_value(counters, "llm_calls", model=model),
+            "入力トークン": counter_value(counters, "llm_tokens", model=model, kind="prompt"),
+            "出力トークン": counter_value(counters, "llm_tokens", model=model, kind="completion"),
+        } for model in models], hide_index=True, use_container_width=True)
+    else:
+        st.caption("LLMの呼び出しはまだありません。")
+
+    with st.expander("🔢 すべてのカウンタ"):
+        st.dataframe([{"名前": c["name"], "ラベル": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                       "値": c["value"]} for c in counters], hide_index=True, use_container_width=True)
+
+    with st.expander("📤 Prometheus形式"):
+        text = telemetry.render_prometheus()
+        st.code(text, language="text")
+        st.download_button("ダウンロード", text, file_name="metrics.txt", mime="text/plain")
+        if telemetry.log_path:
+            st.caption(f"スパンごとのJSONログ: `{telemetry.log_path}`")
+
+
+main()
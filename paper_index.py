@@ -0,0 +1,157 @@
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+from arxiv_cache import normalize_query
+from title_ranking import best_match
+
+PAPER_INDEX_DB_NAME = "papers.sqlite3"
+
+_TOKEN_RE = re.compile(r"\w+")
+_VERSION_RE = re.compile(r"v\d+$")
+
+
+def title_tokens(text):
+    """タイトル比較用のトークン列（正規化済み）"""
+    return _TOKEN_RE.findall(normalize_query(text))
+
+
+class PaperIndex:
+    """取得したことのある論文のローカル全文検索インデックス（SQLite FTS5）
+
+    タイトル・アブストラクト・著者・カテゴリを索引し、
+    タイトル検索をネットワークに出ずに解決できるようにする。
+    FTS5が使えない環境では何も索引せず、検索は常に空を返す。
+    papers.fts_rowid に索引側の rowid を持ち、置き換えは rowid で消す
+    （paper_id は索引されない列なので、それで消すと全件を走査する）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                paper_id TEXT PRIMARY KEY,
+                version_id TEXT NOT NULL,
+                record BLOB NOT NULL,
+                indexed_at REAL NOT NULL,
+                fts_rowid INTEGER
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(papers)")]
+        needs_backfill = "fts_rowid" not in columns
+        if needs_backfill:
+            self._conn.execute("ALTER TABLE papers ADD COLUMN fts_rowid INTEGER")
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                    paper_id UNINDEXED, title, abstract, authors, categories,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            self.enabled = True
+        except sqlite3.OperationalError:
+            self.enabled = False
+        if self.enabled and needs_backfill:
+            # 以前の形式のデータベースは、索引を1回走査して rowid を対応付ける
+            self._conn.executemany(
+                "UPDATE papers SET fts_rowid = ? WHERE paper_id = ?",
+                self._conn.execute("SELECT rowid, paper_id FROM papers_fts").fetchall(),
+            )
+        self._conn.commit()
+
+    def add(self, paper):
+        self.add_many([paper])
+
+    def add_many(self, papers):
+        """論文データをまとめて索引に追加（同じIDは新しい版で置き換え）"""
+        if not self.enabled:
+            return
+        rows = []
+        for paper in papers:
+            if not paper or not paper.get('id'):
+                continue
+            rows.append((_VERSION_RE.sub('', paper['id']), paper))
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            for paper_id, paper in rows:
+                previous = self._conn.execute(
+                    "SELECT fts_rowid FROM papers WHERE paper_id = ?", (paper_id,)
+                ).fetchone()
+                if previous and previous[0] is not None:
+                    self._conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (previous[0],))
+                fts_rowid = self._conn.execute(
+                    "INSERT INTO papers_fts (paper_id, title, abstract, authors, categories) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (paper_id, paper.get('title', ''), paper.get('summary', ''),
+                     " ".join(a for a in paper.get('authors', []) if a),
+                     " ".join(c for c in paper.get('categories', []) if c)),
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO papers "
+                    "(paper_id, version_id, record, indexed_at, fts_rowid) VALUES (?, ?, ?, ?, ?)",
+                    (paper_id, paper['id'], pickle.dumps(paper, protocol=pickle.HIGHEST_PROTOCOL),
+                     now, fts_rowid),
+                )
+            self._conn.commit()
+
+    def get(self, paper_id):
+        """IDで索引済みの論文データを返す"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record FROM papers WHERE paper_id = ?", (_VERSION_RE.sub('', paper_id),)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def search(self, text, limit=20, column=None):
+        """全文検索し、関連度順に論文データのリストを返す"""
+        tokens = title_tokens(text)
+        if not self.enabled or not tokens:
+            return []
+        expression = " AND ".join(f'"{token}"' for token in tokens)
+        if column:
+            expression = f"{column} : ({expression})"
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT p.record FROM papers_fts f JOIN papers p ON p.paper_id = f.paper_id "
+                    "WHERE papers_fts MATCH ? ORDER BY bm25(papers_fts, 0, 10.0, 1.0, 2.0, 0.5) "
+                    "LIMIT ?",
+                    (expression, limit),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [pickle.loads(row[0]) for row in rows]
+
+    def find_title(self, title):
+        """正規化したタイトルが完全に一致する論文があれば (論文データ, 確信度) を返す
+
+        似ているだけの別の論文を返さないよう、完全一致しないものはネットワークでの
+        検索に任せる。同じタイトルが複数あれば title_ranking の順位付けで選ぶ。
+        """
+        tokens = title_tokens(title)
+        exact = [paper for paper in self.search(title, limit=10, column="title")
+                 if title_tokens(paper.get('title', '')) == tokens]
+        best, confidence, _ = best_match(title, exact)
+        if best is None:
+            return None
+        return best, confidence
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_paper_index(cache_dir):
+    """cache_dir 配下の論文インデックスを開く"""
+    return PaperIndex(os.path.join(cache_dir, PAPER_INDEX_DB_NAME))
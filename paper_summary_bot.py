@@ -1,24 +1,30 @@
 import os
-import yaml
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-import arxiv
-import openai
-import random
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-# Load API keys from config.yaml
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+from arxiv_harvester import Watermark, open_harvester
+from batch_jobs import (
+    STATUS_FAILED, STATUS_PENDING, LocalBatchBackend, OpenAIBatchBackend,
+    build_request, collect_results, wait_for_job, write_job_file,
+)
+from paper_index import open_paper_index
+from posted_ledger import open_ledger
+from relevance import HashingEmbedder, OpenAIEmbedder, RelevanceRanker, open_embedding_cache
+from slack_delivery import SlackDeliveryQueue
 
-# Set up APIs
-openai.api_key = config["openai"]["api_key"] # bot_summarize
-SLACK_API_TOKEN = config["slack"]["api_key"] # slack_api_key
+# APIキーなどの設定ファイル（読み込みは main で行い、import 時には何もしない）
+CONFIG_PATH = "config.yaml"
 
 # Slackに投稿するチャンネル名を指定する
 SLACK_CHANNEL = "#news-bot1"
 
-def get_summary(result):
-    system = """まず、与えられた論文の背景となっていた課題、要点3点、今後の展望をまとめ、以下のフォーマットで日本語で出力してください。```
+SUMMARY_MODEL = "gpt-3.5-turbo"
+SUMMARY_TEMPERATURE = 0.25
+
+SYSTEM_PROMPT = """まず、与えられた論文の背景となっていた課題、要点3点、今後の展望をまとめ、以下のフォーマットで日本語で出力してください。```
     タイトルの日本語訳
     ・背景課題
     ・要点1
@@ -29,63 +35,391 @@ def get_summary(result):
     また、与えられた論文について想定され得る批判を述べてください。
     """
 
-    text = f"title: {result.title}\nbody: {result.summary}"
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {'role': 'system', 'content': system},
-            {'role': 'user', 'content': text}
-        ],
-        temperature=0.25,
-    )
-    summary = response['choices'][0]['message']['content']
-    title_en = result.title
+DEFAULT_INTEREST_PROFILE = [
+    "Deep learning methods and neural network architectures",
+    "GPT and large language models",
+    "CRISPR gene editing",
+    "Computer vision and pattern recognition",
+    "Natural language processing",
+    "Software engineering with AI",
+    "Quantum algebra",
+    "Biological physics and applied physics",
+]
+
+
+class BotSettings:
+    """config.yaml の設定（bot セクションの項目は省略可）"""
+
+    def __init__(self, config):
+        bot = config.get("bot", {})
+        self.openai_api_key = config["openai"]["api_key"]  # bot_summarize
+        self.slack_api_token = config["slack"]["api_key"]  # slack_api_key
+        # 要約を同時に実行する数（bot.summary_concurrency）
+        self.summary_concurrency = bot.get("summary_concurrency", 4)
+        # バッチモードの設定（bot.batch_backend / bot.batch_dir / bot.batch_poll_interval）
+        # local は通常のAPIで順に要約する。openai（Batch API）は試験的で openai>=1 が必要
+        self.batch_backend = bot.get("batch_backend", "local")
+        self.batch_dir = bot.get("batch_dir", "batch_jobs")
+        self.batch_poll_interval = bot.get("batch_poll_interval", 60)
+        # ウォーターマークと取得した論文の保存先（bot.harvest_dir）
+        self.harvest_dir = bot.get("harvest_dir", "arxiv_cache")
+        # 長く止まっていた後でも1回に取得する論文数の上限（bot.harvest_max_results）
+        self.harvest_max_results = bot.get("harvest_max_results", 1000)
+        # 初回実行時に遡る日数（bot.initial_lookback_days）
+        self.initial_lookback_days = bot.get("initial_lookback_days", 2)
+        # 投稿済み台帳の保持日数（bot.ledger_max_age_days）
+        self.ledger_max_age_days = bot.get("ledger_max_age_days", 180)
+        # 論文を選ぶための興味プロファイルと埋め込み方式
+        # （bot.interest_profile / bot.embedder: openai | hashing）
+        self.interest_profile = bot.get("interest_profile", DEFAULT_INTEREST_PROFILE)
+        self.embedder = bot.get("embedder", "openai")
+        # 1回の実行分を1つのスレッドにまとめて投稿するか（bot.slack_thread）
+        self.slack_thread = bot.get("slack_thread", False)
+
+
+def load_settings(path=CONFIG_PATH):
+    """設定ファイルを読み込む"""
+    import yaml
+    with open(path, "r") as f:
+        return BotSettings(yaml.safe_load(f))
+
+
+def configure_openai(api_key):
+    """openai を読み込んでAPIキーを設定する（必要になるまで import しない）"""
+    import openai
+    openai.api_key = api_key
+
+
+def create_slack_client(settings):
+    """Slack APIクライアントを作る（投稿するときだけ slack_sdk を読み込む）"""
+    from slack_sdk import WebClient
+    return WebClient(token=settings.slack_api_token)
+
+
+def build_messages(title, abstract):
+    """要約リクエストのメッセージを組み立てる"""
+    text = f"title: {title}\nbody: {abstract}"
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': text}
+    ]
+
+
+def format_message(title_en, entry_id, published, summary):
+    """要約をSlack投稿用のメッセージに整形する"""
     title, *body = summary.split('\n')
     body = '\n'.join(body)
-    date_str = result.published.strftime("%Y-%m-%d %H:%M:%S")
-    message = f"発行日: {date_str}\n{result.entry_id}\n{title_en}\n{title}\n{body}\n"
+    date_str = published.strftime("%Y-%m-%d %H:%M:%S")
+    return f"発行日: {date_str}\n{entry_id}\n{title_en}\n{title}\n{body}\n"
 
-    return message
+
+def complete_chat(model, messages, temperature=SUMMARY_TEMPERATURE):
+    """チャットAPIを呼んで応答の本文を返す"""
+    import openai
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=messages,
+        temperature=SUMMARY_TEMPERATURE if temperature is None else temperature,
+    )
+    return response['choices'][0]['message']['content']
+
+
+def get_summary(result):
+    summary = complete_chat(SUMMARY_MODEL, build_messages(result['title'], result['summary']))
+    return format_message(result['title'], result['entry_id'], result['published_datetime'],
+                          summary)
+
+
+# queryを用意 タイトルにDeep Learning, GPT, CRISPRが入っている、または
+# カテゴリがArtificial Intelligence, Computer Vision and Pattern Recognition,Computation and Language,
+# Software Engineering, Quantum Algebra, Biological Physics, Applied Physics
+QUERY = 'ti:"Deep Learning" OR ti:"GPT" OR ti:"CRISPR" OR ' \
+        'cat:"cs.CV" OR cat:"cs.CL" OR cat:"cs.SE" OR cat:"cs.AI" OR ' \
+        'cat:"math.QA" OR cat:"physics.bio-ph" OR cat:"physics.app-ph"'
+
+
+def create_harvester(settings):
+    """前回の続きから新着論文を取得するハーベスタを作る"""
+    return open_harvester(settings.harvest_dir, store=open_paper_index(settings.harvest_dir),
+                          initial_lookback_days=settings.initial_lookback_days,
+                          max_results=settings.harvest_max_results)
+
+
+def commit_harvest(harvester, failures, watermark=None):
+    """すべて投稿できたときだけウォーターマークを進める（失敗した回は次回に取り直す）"""
+    if failures:
+        print(f"Watermark not advanced: {failures} papers failed")
+        return
+    harvester.commit(QUERY, watermark)
+
+
+def fetch_results(settings, harvester, ledger):
+    """前回の実行以降の新着論文を取得し、投稿する論文を選ぶ"""
+    # 前回処理した投稿日時より新しい論文だけをページ送りで取得する
+    result_list = harvester.harvest(QUERY)
+    print(f"Harvested {len(result_list)} new papers with {harvester.requests} requests")
+    if len(result_list) >= harvester.max_results:
+        print(f"Reached bot.harvest_max_results ({harvester.max_results}); older papers are skipped")
+    # 投稿済みの論文は要約する前に除く
+    result_list = ledger.filter_unseen(result_list, SLACK_CHANNEL)
+    # 興味プロファイルに近い順にnum_papersの数だけ選ぶ
+    num_papers = 10
+    ranked = create_ranker(settings).rank(result_list, top_k=num_papers)
+    for result, score in ranked:
+        print(f"{score:.3f} {result['id']} {result['title']}")
+    return [result for result, _ in ranked]
+
+
+def create_ranker(settings):
+    """設定に応じた埋め込みで関連度ランカーを作る"""
+    fallback = HashingEmbedder()
+    if settings.embedder == "openai":
+        embedder = OpenAIEmbedder(settings.openai_api_key)
+    else:
+        embedder = fallback
+    return RelevanceRanker(embedder, settings.interest_profile,
+                           cache=open_embedding_cache(settings.harvest_dir), fallback=fallback)
 
 
 def main():
-    # Slack APIクライアントを初期化する
-    client = WebClient(token=SLACK_API_TOKEN)
-    # queryを用意 タイトルにDeep Learning, GPT, CRISPRが入っている、または
-    # カテゴリがArtificial Intelligence, Computer Vision and Pattern Recognition,Computation and Language,
-    # Software Engineering, Quantum Algebra, Biological Physics, Applied Physics
-    query = 'ti:%22 Deep Learning %22 OR ti:%22 GPT %22 OR ti:"CRISPR" OR ' \
-            'cat:"cs.CV" OR cat:"cs.CL" OR cat:"cs.SE" OR cat:"cs.AI" OR ' \
-            'cat:"math.QA" OR cat:"physics.bio-ph" OR cat:"physics.app-ph"'
-
-    # arxiv APIで最新の論文情報を取得する
-    search = arxiv.Search(
-        query=query,  # 検索クエリ（
-        max_results=10,  # 取得する論文数
-        sort_by=arxiv.SortCriterion.SubmittedDate,  # 論文を投稿された日付でソートする
-        sort_order=arxiv.SortOrder.Descending,  # 新しい論文から順に取得する
+    args = parse_args()
+    settings = load_settings(args.config)
+    configure_openai(settings.openai_api_key)
+    # 投稿済み論文の台帳（古い記録は削除する）
+    ledger = open_ledger(settings.harvest_dir)
+    ledger.prune(settings.ledger_max_age_days)
+
+    if args.batch is None:
+        harvester = create_harvester(settings)
+        # 要約と投稿をパイプラインで実行する
+        failures = run_pipeline(settings, create_slack_client(settings),
+                                fetch_results(settings, harvester, ledger), ledger)
+        commit_harvest(harvester, failures)
+        return
+
+    backend = create_batch_backend(settings)
+    harvester = create_harvester(settings)
+    if args.batch in ("submit", "run"):
+        # ウォーターマークはマニフェストに残し、投稿が済んでから進める
+        results = fetch_results(settings, harvester, ledger)
+        manifest_path = submit_batch(settings, backend, results, harvester.pending(QUERY))
+        print(f"Batch submitted: {manifest_path}")
+    else:
+        manifest_path = args.manifest or latest_manifest(settings)
+    if args.batch in ("post", "run"):
+        post_batch(settings, create_slack_client(settings), backend, manifest_path, ledger,
+                   harvester, wait=args.batch == "run" or args.wait)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="arXivの論文を要約してSlackに投稿する")
+    parser.add_argument("--config", default=CONFIG_PATH, help="設定ファイル（既定: config.yaml）")
+    parser.add_argument(
+        "--batch", choices=["submit", "post", "run"],
+        help="バッチモード: submit=ジョブ投入のみ, post=結果を投稿, run=投入から投稿まで"
     )
-    # searchの結果をリストに格納
-    result_list = []
-    for result in search.results():
-        result_list.append(result)
-    # ランダムにnum_papersの数だけ選ぶ
-    num_papers = 10
-    results = random.sample(result_list, k=num_papers)
+    parser.add_argument("--manifest", help="post で使うマニフェスト（省略時は最新）")
+    parser.add_argument("--wait", action="store_true", help="post でジョブ完了まで待つ")
+    return parser.parse_args()
+
+
+def create_batch_backend(settings):
+    """設定に応じたバッチバックエンドを作る"""
+    if settings.batch_backend not in ("local", "openai"):
+        raise SystemExit(f"Unknown bot.batch_backend: {settings.batch_backend} (local | openai)")
+    if settings.batch_backend == "local":
+        return LocalBatchBackend(os.path.join(settings.batch_dir, "local"), complete_chat)
+    import openai
+    if not hasattr(openai, "OpenAI"):
+        raise SystemExit(
+            "bot.batch_backend: openai requires openai>=1 (the OpenAI client class is missing); "
+            "upgrade the openai package or set bot.batch_backend to local"
+        )
+    return OpenAIBatchBackend(openai.OpenAI(api_key=settings.openai_api_key))
+
+
+def submit_batch(settings, backend, results, watermark=None):
+    """全論文のプロンプトをJSONLに書き出してジョブを投入し、マニフェストのパスを返す
+
+    watermark（harvest で得たもの）はマニフェストに残し、post で投稿が済んだら進める。
+    """
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    job_path = os.path.join(settings.batch_dir, f"{run_id}.jsonl")
+    papers = []
+    job_requests = []
+    for result in results:
+        paper_id = result['id']
+        papers.append({
+            "id": paper_id,
+            "title": result['title'],
+            "entry_id": result['entry_id'],
+            "published": result['published_datetime'].isoformat(),
+        })
+        job_requests.append(build_request(
+            paper_id, SUMMARY_MODEL, build_messages(result['title'], result['summary']),
+            SUMMARY_TEMPERATURE
+        ))
+    write_job_file(job_path, job_requests)
+    job_id = backend.submit(job_path)
+
+    manifest_path = os.path.join(settings.batch_dir, f"{run_id}.manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"job_id": job_id, "job_path": job_path, "papers": papers,
+                   "watermark": watermark.as_dict() if watermark is not None else None},
+                  f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+
+def latest_manifest(settings):
+    if not os.path.isdir(settings.batch_dir):
+        raise SystemExit("No batch manifest found")
+    names = sorted(name for name in os.listdir(settings.batch_dir)
+                   if name.endswith(".manifest.json"))
+    if not names:
+        raise SystemExit("No batch manifest found")
+    return os.path.join(settings.batch_dir, names[-1])
+
+
+def post_batch(settings, client, backend, manifest_path, ledger, harvester, wait=False):
+    """バッチの結果を論文IDで対応付け、マニフェストの順番で投稿する
+
+    すべて投稿できたら、マニフェストのウォーターマークまで harvester を進める。
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    job_id = manifest["job_id"]
+
+    if wait:
+        status = wait_for_job(backend, job_id, interval=settings.batch_poll_interval)
+    else:
+        status = backend.status(job_id)
+    if status == STATUS_PENDING:
+        print(f"Batch {job_id} is still running")
+        return
+    if status == STATUS_FAILED:
+        print(f"Batch {job_id} failed")
+        return
+
+    results = collect_results(backend, job_id)
+    start = time.perf_counter()
+    failures = 0
+    summaries = []
+    for paper in manifest["papers"]:
+        if ledger.seen(paper["id"], SLACK_CHANNEL):
+            # 同じマニフェストを二度投稿しない
+            continue
+        content, error = results.get(paper["id"], (None, "missing from batch output"))
+        if content is None:
+            failures += 1
+            print(f"Error summarizing {paper['entry_id']}: {error}")
+            continue
+        summaries.append((paper["id"], format_message(
+            paper["title"], paper["entry_id"], datetime.fromisoformat(paper["published"]), content
+        )))
+
+    delivery = SlackDeliveryQueue(client)
+    thread_ts = start_run_thread(settings, delivery, len(summaries))
+    post_futures = [(paper_id, post_message(delivery, i + 1, summary, thread_ts))
+                    for i, (paper_id, summary) in enumerate(summaries)]
+    post_failures = wait_for_posts(post_futures, ledger)
+    delivery.close()
+    print_timings(time.perf_counter() - start, [], delivery.post_times,
+                  len(post_futures) - post_failures, failures + post_failures)
+    watermark = manifest.get("watermark")
+    if watermark is not None:
+        commit_harvest(harvester, failures + post_failures, Watermark.from_dict(watermark))
 
-    # 論文情報をSlackに投稿する
-    for i, result in enumerate(results):
+
+def post_message(delivery, number, summary, thread_ts=None):
+    """n本目として投稿キューに入れ、投稿完了の Future を返す"""
+    # Slackに投稿するメッセージを組み立てる
+    message = "今日の論文です。 " + str(number) + "本目\n" + summary
+    # Slackにメッセージを投稿する
+    return delivery.submit(SLACK_CHANNEL, message, thread_ts=thread_ts)
+
+
+def start_run_thread(settings, delivery, count):
+    """設定で有効なら親メッセージを投稿し、返信先の ts を返す"""
+    if not settings.slack_thread or count == 0:
+        return None
+    try:
+        return delivery.start_thread(SLACK_CHANNEL, f"今日の論文です（{count}本）")
+    except Exception as e:
+        print(f"Error posting thread parent: {e}")
+        return None
+
+
+def wait_for_posts(post_futures, ledger):
+    """投稿の完了を待って台帳に記録し、失敗件数を返す"""
+    failures = 0
+    for paper_id, future in post_futures:
         try:
-            # Slackに投稿するメッセージを組み立てる
-            message = "今日の論文です。 " + str(i + 1) + "本目\n" + get_summary(result)
-            # Slackにメッセージを投稿する
-            response = client.chat_postMessage(
-                channel=SLACK_CHANNEL,
-                text=message
-            )
+            response = future.result()
+            ledger.record(paper_id, SLACK_CHANNEL)
             print(f"Message posted: {response['ts']}")
-        except SlackApiError as e:
+        except Exception as e:
+            failures += 1
             print(f"Error posting message: {e}")
+    return failures
+
+
+def timed_summary(result):
+    """要約を生成し、(メッセージ, 所要秒数) を返す"""
+    start = time.perf_counter()
+    message = get_summary(result)
+    return message, time.perf_counter() - start
+
+
+def run_pipeline(settings, client, results, ledger, concurrency=None):
+    """要約を並列に生成し、できた順ではなく元の順番でSlackに投稿する
+
+    要約はスレッドプールで並列に走り、投稿はその完了を先頭から順に待ちながら
+    進むため、n本目の投稿中にも後続の要約が進む。1本の失敗は他に影響しない。
+    要約・投稿に失敗した件数を返す。
+    """
+    if concurrency is None:
+        concurrency = settings.summary_concurrency
+    pipeline_start = time.perf_counter()
+    summary_times = []
+    failures = 0
+    post_futures = []
+    delivery = SlackDeliveryQueue(client)
+    thread_ts = start_run_thread(settings, delivery, len(results))
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(timed_summary, result) for result in results]
+
+        # 論文情報をSlackに投稿する（投稿キューが間隔調整と再試行を受け持つ）
+        for result, future in zip(results, futures):
+            try:
+                summary, elapsed = future.result()
+                summary_times.append(elapsed)
+            except Exception as e:
+                failures += 1
+                print(f"Error summarizing {result['entry_id']}: {e}")
+                continue
+
+            post_futures.append((result['id'], post_message(delivery, len(post_futures) + 1,
+                                                            summary, thread_ts)))
+
+    post_failures = wait_for_posts(post_futures, ledger)
+    delivery.close()
+    print_timings(time.perf_counter() - pipeline_start, summary_times, delivery.post_times,
+                  len(post_futures) - post_failures, failures + post_failures)
+    return failures + post_failures
+
+
+def print_timings(wall_time, summary_times, post_times, posted, failures):
+    """各ステージの所要時間を表示"""
+    def describe(times):
+        if not times:
+            return "n=0"
+        return (f"n={len(times)} total={sum(times):.1f}s "
+                f"avg={sum(times) / len(times):.1f}s max={max(times):.1f}s")
+
+    print(f"Summarize stage: {describe(summary_times)}")
+    print(f"Post stage: {describe(post_times)}")
+    print(f"Wall time: {wall_time:.1f}s posted={posted} failed={failures}")
 
 if __name__ == '__main__':
     main()
@@ -1,16 +1,31 @@
 import streamlit as st
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-import openai
-from notion_client import Client
+import os
 import re
 import time
 import random
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-import pickle
-import os
+
+from arxiv_atom import iter_entries, iter_pages
+from arxiv_ids import extract_arxiv_id, extract_arxiv_ids
+from arxiv_cache import normalize_query, open_cache_store, split_legacy_query
+from embedding_store import open_embedding_store
+from fulltext import MAP_PROMPT, build_reduce_text, iter_chunks, iter_page_texts, map_chunks
+from http_session import PooledHttpSession
+from lazy_registry import LazyRegistry
+from model_router import TIER_FAST, TIER_REASONING, TIER_STANDARD, count_tokens, open_router
+from notion_writer import NotionWriter, open_page_index
+from paper_index import open_paper_index
+from pdf_cache import open_pdf_cache
+from rate_limit import SingleFlight, TokenBucket
+from relevance import HashingEmbedder, paper_text
+from slack_delivery import SlackDeliveryQueue
+from summary_cache import open_summary_cache, split_version
+from telemetry import (STAGE_CACHE, STAGE_FETCH, STAGE_LLM, STAGE_NOTION, STAGE_PARSE,
+                       get_telemetry, open_telemetry, serve_metrics)
+from title_ranking import CONFIDENCE_THRESHOLD, best_match
 
 # ページ設定
 st.set_page_config(
@@ -20,327 +35,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# カスタムCSS - ダークモード & 大人っぽい配色
-st.markdown("""
-<style>
-    /* 全体のベース設定 */
-    .stApp {
-        background-color: #262236;
-        color: #fefef3;
-    }
-    
-    /* サイドバー */
-    .css-1d391kg {
-        background-color: #3d4f7e;
-    }
-    
-    /* メインヘッダー */
-    .main-header {
-        text-align: center;
-        padding: 3rem 0;
-        background: linear-gradient(135deg, #3d4f7e 0%, #262236 50%, #e18546 100%);
-        color: #fefef3;
-        margin: -1rem -1rem 2rem -1rem;
-        border-radius: 0 0 20px 20px;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .main-header::before {
-        content: "";
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        background: radial-gradient(circle at 30% 40%, rgba(225, 133, 70, 0.1) 0%, transparent 50%);
-        pointer-events: none;
-    }
-    
-    .main-header h1 {
-        font-size: 2.8rem;
-        margin-bottom: 0.5rem;
-        font-weight: 700;
-        text-shadow: 0 2px 10px rgba(0, 0, 0, 0.3);
-    }
-    
-    .main-header p {
-        font-size: 1.3rem;
-        opacity: 0.9;
-        font-weight: 300;
-    }
-    
-    /* 検索方法コンテナ */
-    .search-method-container {
-        background: linear-gradient(135deg, #3d4f7e 0%, #495a8a 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        border: 1px solid #4a5c91;
-        margin-bottom: 1.5rem;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* 論文情報ボックス */
-    .paper-info-box {
-        background: linear-gradient(135deg, #3d4f7e 0%, #495a8a 100%);
-        border: 2px solid #e18546;
-        border-radius: 15px;
-        padding: 2rem;
-        margin: 1.5rem 0;
-        box-shadow: 0 8px 32px rgba(225, 133, 70, 0.1);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .paper-info-box::before {
-        content: "";
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 4px;
-        background: linear-gradient(90deg, #e18546 0%, #f4a261 100%);
-    }
-    
-    /* 要約ボックス */
-    .summary-box {
-        background: linear-gradient(135deg, #2a1f3d 0%, #3d4f7e 100%);
-        border-left: 6px solid #e18546;
-        border-radius: 0 15px 15px 0;
-        padding: 2rem;
-        margin: 1.5rem 0;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.2);
-        position: relative;
-    }
-    
-    .summary-box::after {
-        content: "";
-        position: absolute;
-        right: 20px;
-        top: 20px;
-        width: 40px;
-        height: 40px;
-        background: radial-gradient(circle, #e18546 0%, transparent 70%);
-        border-radius: 50%;
-        opacity: 0.3;
-    }
-    
-    /* メッセージボックス */
-    .success-message {
-        background: linear-gradient(135deg, #2d5016 0%, #52b788 100%);
-        color: #fefef3;
-        border: 1px solid #52b788;
-        border-radius: 12px;
-        padding: 1.2rem;
-        margin: 1rem 0;
-        box-shadow: 0 4px 16px rgba(82, 183, 136, 0.2);
-    }
-    
-    .error-message {
-        background: linear-gradient(135deg, #8b2635 0%, #e63946 100%);
-        color: #fefef3;
-        border: 1px solid #e63946;
-        border-radius: 12px;
-        padding: 1.2rem;
-        margin: 1rem 0;
-        box-shadow: 0 4px 16px rgba(230, 57, 70, 0.2);
-    }
-    
-    .warning-message {
-        background: linear-gradient(135deg, #b5651d 0%, #e18546 100%);
-        color: #fefef3;
-        border: 1px solid #e18546;
-        border-radius: 12px;
-        padding: 1.2rem;
-        margin: 1rem 0;
-        box-shadow: 0 4px 16px rgba(225, 133, 70, 0.2);
-    }
-    
-    /* フッター */
-    .footer-tips {
-        background: linear-gradient(135deg, #2a1f3d 0%, #3d4f7e 100%);
-        border-radius: 15px;
-        padding: 2rem;
-        margin-top: 2rem;
-        border: 1px solid #4a5c91;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* ボタンスタイル */
-    .stButton > button {
-        width: 100%;
-        border-radius: 12px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        background: linear-gradient(135deg, #e18546 0%, #f4a261 100%);
-        border: none;
-        color: #262236;
-        font-size: 1rem;
-        padding: 0.6rem 1.2rem;
-        box-shadow: 0 4px 16px rgba(225, 133, 70, 0.3);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 8px 24px rgba(225, 133, 70, 0.4);
-        background: linear-gradient(135deg, #f4a261 0%, #e76f51 100%);
-    }
-    
-    .stButton > button:active {
-        transform: translateY(0px);
-        box-shadow: 0 4px 16px rgba(225, 133, 70, 0.3);
-    }
-    
-    /* プライマリボタン */
-    .stButton > button[kind="primary"] {
-        background: linear-gradient(135deg, #3d4f7e 0%, #495a8a 100%);
-        color: #fefef3;
-        box-shadow: 0 4px 16px rgba(61, 79, 126, 0.3);
-    }
-    
-    .stButton > button[kind="primary"]:hover {
-        background: linear-gradient(135deg, #495a8a 0%, #5a6ba3 100%);
-        box-shadow: 0 8px 24px rgba(61, 79, 126, 0.4);
-    }
-    
-    /* 入力フィールド */
-    .stTextInput > div > div > input {
-        background-color: #3d4f7e;
-        color: #fefef3;
-        border: 2px solid #4a5c91;
-        border-radius: 10px;
-        padding: 0.7rem;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #e18546;
-        box-shadow: 0 0 10px rgba(225, 133, 70, 0.3);
-    }
-    
-    /* セレクトボックス */
-    .stSelectbox > div > div > select {
-        background-color: #3d4f7e;
-        color: #fefef3;
-        border: 2px solid #4a5c91;
-        border-radius: 10px;
-    }
-    
-    /* テキストエリア */
-    .stTextArea > div > div > textarea {
-        background-color: #3d4f7e;
-        color: #fefef3;
-        border: 2px solid #4a5c91;
-        border-radius: 10px;
-    }
-    
-    .stTextArea > div > div > textarea:focus {
-        border-color: #e18546;
-        box-shadow: 0 0 10px rgba(225, 133, 70, 0.3);
-    }
-    
-    /* ラジオボタン */
-    .stRadio > div {
-        background-color: rgba(61, 79, 126, 0.3);
-        padding: 1rem;
-        border-radius: 10px;
-        border: 1px solid #4a5c91;
-    }
-    
-    /* エキスパンダー */
-    .streamlit-expanderHeader {
-        background-color: #3d4f7e;
-        color: #fefef3;
-        border-radius: 10px;
-        border: 1px solid #4a5c91;
-    }
-    
-    .streamlit-expanderContent {
-        background-color: rgba(61, 79, 126, 0.2);
-        border: 1px solid #4a5c91;
-        border-top: none;
-        border-radius: 0 0 10px 10px;
-    }
-    
-    /* メトリクス */
-    .metric-container {
-        background: linear-gradient(135deg, #3d4f7e 0%, #495a8a 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        border: 1px solid #4a5c91;
-        margin: 0.5rem 0;
-    }
-    
-    /* スピナー */
-    .stSpinner {
-        color: #e18546 !important;
-    }
-    
-    /* マークダウンのコードブロック */
-    .stMarkdown code {
-        background-color: #2a1f3d;
-        color: #e18546;
-        padding: 0.2rem 0.4rem;
-        border-radius: 4px;
-        border: 1px solid #4a5c91;
-    }
-    
-    /* プログレスバー */
-    .stProgress > div > div > div {
-        background-color: #e18546;
-    }
-    
-    /* 情報ボックス */
-    .stInfo {
-        background-color: rgba(61, 79, 126, 0.3);
-        border-left: 4px solid #e18546;
-        color: #fefef3;
-    }
-    
-    /* 列の区切り線 */
-    .element-container {
-        border-right: 1px solid rgba(254, 254, 243, 0.1);
-    }
-    
-    /* カスタムアクセント */
-    .accent-gradient {
-        background: linear-gradient(45deg, #e18546, #3d4f7e);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-        font-weight: bold;
-    }
-    
-    /* ホバーエフェクト */
-    .hover-glow:hover {
-        box-shadow: 0 0 20px rgba(225, 133, 70, 0.3);
-        transition: all 0.3s ease;
-    }
-    
-    /* スクロールバー */
-    ::-webkit-scrollbar {
-        width: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #262236;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: #e18546;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #f4a261;
-    }
-</style>
-""", unsafe_allow_html=True)
+# カスタムCSS - ダークモード & 大人っぽい配色（static/style.css）
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+STYLE_URL = "app/static/style.css"
 
 # 定数
 SLACK_CHANNEL = "#news-bot1"
 CACHE_DIR = "arxiv_cache"
 ARXIV_API_BASE = "http://export.arxiv.org/api/query"
+ARXIV_ID_CHUNK_SIZE = 50  # id_listに1リクエストで詰めるID数
+ARXIV_MIN_INTERVAL = 3  # arXiv APIへのリクエスト間隔（秒）
+TITLE_CANDIDATES = 10  # タイトルのフレーズ検索で順位付けする候補数
+PARTIAL_MATCH_CANDIDATES = 25  # 部分一致検索で順位付けする候補数
+SIMILAR_PAPERS = 5  # 「関連する要約済み論文」に表示する件数
+SIMILAR_SEARCH_K = 50  # 要約済みに絞り込む前に近傍検索で取る件数
 
 GPT_MODELS = {
     "GPT-4o": "gpt-4o-2024-08-06",
@@ -348,6 +56,23 @@ GPT_MODELS = {
     "GPT-4.1": "gpt-4.1-2025-04-14",
     "o3": "o3-2025-04-16"
 }
+AUTO_MODEL_LABEL = "自動選択（ルーター）"
+QUALITY_TIERS = {
+    "速さ優先": TIER_FAST,
+    "標準": TIER_STANDARD,
+    "推論モデル": TIER_REASONING,
+}
+
+SUMMARY_TEMPERATURE = 0.25
+# 出力上限（finish_reason=length）で止まった要約の末尾に付ける注記
+TRUNCATION_NOTE = "\n\n⚠️ 出力トークンの上限に達したため、要約は途中で切れています。"
+STREAM_RENDER_INTERVAL = 0.05  # ストリーミング時の再描画間隔（秒）
+SLACK_UI_WAIT = 5  # Slack投稿の完了を画面で待つ最大秒数
+BULK_METHOD = "まとめて指定（一括）"
+BULK_MAX_PAPERS = 50  # 一括モードで一度に扱う論文数の上限
+BULK_CONCURRENCY = 4  # 一括モードで同時に要約する論文数
+FULLTEXT_CONCURRENCY = 4  # 全文モードでチャンクを同時に要約する数
+FULLTEXT_CACHE_TAG = "[fulltext]\n"  # 全文モードの要約はアブストラクトの要約と別にキャッシュする
 
 DEFAULT_PROMPT = """まず、与えられた論文の背景となっていた課題について述べてください。
 次に、要点を3点、まとめて下さい。
@@ -377,7 +102,11 @@ def load_config():
             },
             'settings': {
                 'notion_database_url': st.secrets["NotionDatabaseUrl"]["key"],
-                'slack_channel': SLACK_CHANNEL
+                'slack_channel': SLACK_CHANNEL,
+                # 設定されていれば /metrics（Prometheus形式）を公開する
+                'metrics_port': st.secrets.get("Metrics", {}).get("port"),
+                # true ならスパンごとのJSONログ（telemetry.jsonl）を書く
+                'metrics_log': st.secrets.get("Metrics", {}).get("log", False)
             }
         }
         
@@ -411,250 +140,409 @@ def load_config():
         """)
         st.stop()
 
+def count_cache_hits(hits):
+    """このセッションのキャッシュヒット数に足す（サイドバーの統計用）"""
+    if hits:
+        st.session_state.cache_hits = st.session_state.get('cache_hits', 0) + hits
+
+def count_error(apis, count=1):
+    """このセッションとプロセス全体のエラー数に足す"""
+    st.session_state.error_count = st.session_state.get('error_count', 0) + count
+    apis["telemetry"].count("errors", count)
+
+def is_client_error(error):
+    """リトライしても結果が変わらない 4xx の HTTPError か（429 は除く）"""
+    response = getattr(error, "response", None)
+    if not isinstance(error, requests.HTTPError) or response is None:
+        return False
+    return 400 <= response.status_code < 500 and response.status_code != 429
+
 # 改良されたarXiv検索クラス
 class ImprovedArxivSearch:
-    def __init__(self, cache_dir=CACHE_DIR):
+    def __init__(self, cache_dir=CACHE_DIR, cache=None, id_chunk_size=ARXIV_ID_CHUNK_SIZE, http=None,
+                 index=None, embedder=None, embeddings=None, telemetry=None):
         self.api_base = ARXIV_API_BASE
+        self.telemetry = telemetry if telemetry is not None else get_telemetry()
+        # 取得した論文はすべてローカルの全文検索インデックスにも入れる
+        self.index = index if index is not None else open_paper_index(cache_dir)
+        # 関連論文の検索用に、取得した論文の埋め込みをメモリマップのストアに追記する
+        self.embedder = embedder or HashingEmbedder()
+        self.embeddings = (embeddings if embeddings is not None
+                           else open_embedding_store(cache_dir, self.embedder))
+        # keep-alive・gzip対応のセッションをインスタンスの寿命の間使い回す
+        self.http = http if http is not None else PooledHttpSession()
+        self.id_chunk_size = id_chunk_size
         self.cache_dir = cache_dir
-        os.makedirs(cache_dir, exist_ok=True)
+        self.cache = cache if cache is not None else open_cache_store(cache_dir)
+        # セッション間で共有されるレート制限と同一リクエストの集約
+        self.rate_limiter = TokenBucket(rate=1 / ARXIV_MIN_INTERVAL, capacity=1)
+        self.single_flight = SingleFlight()
     
     def extract_arxiv_id_from_url(self, url):
-        """arXiv URLからIDを抽出する"""
-        try:
-            patterns = [
-                r'arxiv\.org/abs/([0-9]{4}\.[0-9]{4,5}v?[0-9]*)',
-                r'arxiv\.org/pdf/([0-9]{4}\.[0-9]{4,5}v?[0-9]*)\.pdf',
-                r'^([0-9]{4}\.[0-9]{4,5}v?[0-9]*)$',
-                r'arxiv\.org/abs/([a-z-]+/[0-9]{7})',  # 古い形式
-                r'arxiv\.org/pdf/([a-z-]+/[0-9]{7})'   # 古い形式
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, url)
-                if match:
-                    arxiv_id = match.group(1)
-                    # バージョン番号を削除
-                    arxiv_id = re.sub(r'v\d+$', '', arxiv_id)
-                    return arxiv_id
-            
-            return None
-        except Exception:
-            return None
+        """arXiv URLからIDを抽出する（パターンはコンパイル済みのものを使う）"""
+        return extract_arxiv_id(url)
     
-    def get_cached_results(self, query, max_age_hours=6):
+    def get_cached_results(self, query, max_age_hours=None):
         """キャッシュから結果を取得"""
-        cache_path = os.path.join(self.cache_dir, f"{hash(query)}.pkl")
-        
-        if os.path.exists(cache_path):
-            mtime = datetime.fromtimestamp(os.path.getmtime(cache_path))
-            if datetime.now() - mtime < timedelta(hours=max_age_hours):
-                try:
-                    with open(cache_path, 'rb') as f:
-                        return pickle.load(f)
-                except Exception:
-                    os.remove(cache_path)
-        
-        return None
+        namespace, key = split_legacy_query(query)
+        max_age = None if max_age_hours is None else max_age_hours * 3600
+        return self.cache.get(namespace, key, max_age=max_age)
     
-    def save_results(self, query, results):
-        """結果をキャッシュに保存"""
-        cache_path = os.path.join(self.cache_dir, f"{hash(query)}.pkl")
+    def save_results(self, query, results, etag=None, last_modified=None):
+        """結果をキャッシュに保存（論文の updated とレスポンスの検証子も残す）"""
+        namespace, key = split_legacy_query(query)
+        updated = results.get('updated') if isinstance(results, dict) else None
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(results, f)
+            self.cache.set(namespace, key, results, etag=etag, last_modified=last_modified,
+                           updated=updated)
         except Exception as e:
             st.warning(f"キャッシュ保存に失敗: {e}")
     
-    def search_arxiv_api(self, query, max_results=5, retry_count=3):
-        """直接arXiv APIで検索"""
-        params = {
-            'search_query': query,
-            'max_results': max_results,
-            'sortBy': 'submittedDate',
-            'sortOrder': 'descending'
-        }
-        
+    def _fetch_stream(self, params, retry_count=3, headers=None):
+        """APIを呼び出し、レスポンス本体をストリームで返す（失敗時はリトライ）"""
         for attempt in range(retry_count):
             try:
-                response = requests.get(self.api_base, params=params, timeout=30)
-                response.raise_for_status()
-                
-                # XMLパース
-                root = ET.fromstring(response.content)
-                
-                # 名前空間の設定
-                namespaces = {
-                    'atom': 'http://www.w3.org/2005/Atom',
-                    'arxiv': 'http://arxiv.org/schemas/atom'
-                }
-                
-                entries = root.findall('atom:entry', namespaces)
-                if not entries:
-                    return None
-                
-                # 最初のエントリを取得
-                entry = entries[0]
-                
-                # メタデータの抽出
-                paper_data = {
-                    'id': entry.find('atom:id', namespaces).text.split('/')[-1],
-                    'title': entry.find('atom:title', namespaces).text.strip(),
-                    'summary': entry.find('atom:summary', namespaces).text.strip(),
-                    'published': entry.find('atom:published', namespaces).text,
-                    'updated': entry.find('atom:updated', namespaces).text,
-                    'authors': [author.find('atom:name', namespaces).text 
-                               for author in entry.findall('atom:author', namespaces)],
-                    'categories': [cat.get('term') 
-                                  for cat in entry.findall('atom:category', namespaces)]
-                }
-                
-                # URL情報を追加
-                paper_data['entry_id'] = f"http://arxiv.org/abs/{paper_data['id']}"
-                paper_data['pdf_url'] = f"http://arxiv.org/pdf/{paper_data['id']}.pdf"
-                
-                # 日付情報をdatetimeオブジェクトに変換
-                try:
-                    paper_data['published_datetime'] = datetime.fromisoformat(paper_data['published'].replace('Z', '+00:00'))
-                except:
-                    paper_data['published_datetime'] = datetime.now()
-                
-                return paper_data
+                # arXivの利用規約に従い、プロセス全体でリクエスト間隔を空ける
+                self.rate_limiter.acquire()
+                with self.telemetry.span(STAGE_FETCH, attempt=attempt + 1) as span:
+                    stream = self.http.get_stream(self.api_base, params=params, headers=headers)
+                    span["status"] = stream.status_code
+                return stream
                 
             except requests.RequestException as e:
+                # 不正なIDなどの 4xx はリトライしても結果が変わらない（429 はリトライする）
+                if is_client_error(e):
+                    raise
                 wait_time = (2 ** attempt) + random.uniform(0, 1)
                 if attempt < retry_count - 1:
                     st.warning(f"⚠️ API接続エラー（{attempt + 1}/{retry_count}）。{wait_time:.1f}秒後にリトライします...")
                     time.sleep(wait_time)
                 else:
-                    st.error(f"❌ API接続に失敗しました: {e}")
-                    
-            except ET.ParseError as e:
-                st.error(f"❌ XMLパースエラー: {e}")
-                break
-                
-        return None
+                    raise
+    
+    def iter_search(self, query, page_size=100, max_results=None, retry_count=3,
+                    sort_by='submittedDate'):
+        """検索結果をページングしながら1件ずつ返す（途中で止めれば以降は取得しない）"""
+        def fetch_page(start, size):
+            params = {
+                'search_query': query,
+                'start': start,
+                'max_results': size,
+                'sortBy': sort_by,
+                'sortOrder': 'descending'
+            }
+            return self._fetch_stream(params, retry_count)
+        
+        # 本文は読みながらパースするため、パースの時間には本文の受信も含まれる
+        return self.telemetry.timed_iter(
+            STAGE_PARSE, iter_pages(fetch_page, page_size=page_size, max_results=max_results),
+            source="query"
+        )
+    
+    def search_arxiv_candidates(self, query, max_results=5, retry_count=3, sort_by='submittedDate'):
+        """直接arXiv APIで検索し、候補をすべて返す"""
+        def fetch():
+            candidates = list(self.iter_search(query, page_size=max_results,
+                                               max_results=max_results, retry_count=retry_count,
+                                               sort_by=sort_by))
+            self._remember(candidates)
+            return candidates
+        
+        try:
+            # 同じクエリが実行中なら、その結果を待って共有する
+            return self.single_flight.do(("query", query, max_results, sort_by), fetch)
+        except requests.RequestException as e:
+            st.error(f"❌ API接続に失敗しました: {e}")
+        except ET.ParseError as e:
+            st.error(f"❌ XMLパースエラー: {e}")
+        return []
+    
+    def search_arxiv_api(self, query, max_results=5, retry_count=3):
+        """直接arXiv APIで検索"""
+        candidates = self.search_arxiv_candidates(query, max_results, retry_count)
+        if not candidates:
+            return None
+        
+        # 最初のエントリを取得
+        return candidates[0]
     
     def search_by_id(self, arxiv_id):
         """IDで論文を検索"""
-        cache_key = f"id:{arxiv_id}"
-        cached_result = self.get_cached_results(cache_key)
-        if cached_result:
-            st.info("🗄️ キャッシュから結果を取得しました")
-            return cached_result
+        return self.search_by_ids([arxiv_id]).get(arxiv_id)
+    
+    def search_by_ids(self, arxiv_ids, chunk_size=None):
+        """複数のIDで論文をまとめて検索
+        
+        キャッシュにないIDだけを id_list にカンマ区切りで詰め、
+        chunk_size 件ずつのリクエストで取得する。
+        戻り値は {入力ID: 論文データまたはNone}（入力順）。
+        """
+        chunk_size = chunk_size or self.id_chunk_size
+        results = {}
+        misses = []
+        stale = []
+        with self.telemetry.span(STAGE_CACHE, cache="metadata", keys=len(arxiv_ids)):
+            for arxiv_id in arxiv_ids:
+                if arxiv_id in results:
+                    continue
+                entry = self.cache.lookup("id", arxiv_id)
+                results[arxiv_id] = entry.value if entry is not None and entry.fresh else None
+                if entry is None or not entry.value:
+                    misses.append(arxiv_id)
+                elif not entry.fresh:
+                    stale.append((arxiv_id, entry))
+        
+        cache_hits = len(results) - len(misses) - len(stale)
+        self._count_lookups(hits=cache_hits, stale=len(stale), misses=len(misses))
+        if cache_hits:
+            st.info(f"🗄️ キャッシュから{cache_hits}件の結果を取得しました")
+            count_cache_hits(cache_hits)
+        
+        # 期限切れのものは取り直す前に、変わっていないかを確かめる
+        if stale:
+            self._revalidate_ids(stale, results, chunk_size)
+        
+        for start in range(0, len(misses), chunk_size):
+            chunk = misses[start:start + chunk_size]
+            try:
+                fetched, validators = self.single_flight.do(
+                    ("ids", tuple(chunk)), lambda: self._fetch_ids_splitting(chunk)
+                )
+                
+                for arxiv_id in chunk:
+                    paper_data = fetched.get(arxiv_id)
+                    if paper_data is None:
+                        continue
+                    results[arxiv_id] = paper_data
+                    # キャッシュに保存（検証子はこのIDだけのレスポンスのときに限り残す）
+                    self.save_results(f"id:{arxiv_id}", paper_data,
+                                      **(validators if len(chunk) == 1 else {}))
+                    
+            except Exception as e:
+                st.error(f"❌ ID検索エラー: {e}")
+        
+        return results
+    
+    def _revalidate_ids(self, stale, results, chunk_size):
+        """期限切れのIDエントリを確かめ、変わっていなければ期限だけを延ばす
+        
+        版つきのIDは内容が変わらないので問い合わせない。それ以外は id_list で
+        まとめて最新の updated と比べる（1件で検証子があれば条件付きリクエスト）。
+        """
+        probes = []
+        for arxiv_id, entry in stale:
+            results[arxiv_id] = entry.value
+            if split_version(arxiv_id)[1]:
+                self.cache.refresh("id", arxiv_id)
+            else:
+                probes.append((arxiv_id, entry))
+        
+        for start in range(0, len(probes), chunk_size):
+            chunk = probes[start:start + chunk_size]
+            ids = [arxiv_id for arxiv_id, _ in chunk]
+            headers = chunk[0][1].conditional_headers() if len(chunk) == 1 else {}
+            try:
+                fetched, validators = self.single_flight.do(
+                    ("probe", tuple(ids), tuple(headers.items())),
+                    lambda: self._fetch_ids(ids, headers=headers or None)
+                )
+            except Exception as e:
+                # 確かめられなければ期限切れの値をそのまま使う
+                st.warning(f"⚠️ キャッシュの再検証に失敗したため、保存済みの結果を使います: {e}")
+                continue
+            
+            for arxiv_id, entry in chunk:
+                if fetched is None:
+                    # 304 Not Modified
+                    self.cache.refresh("id", arxiv_id, **validators)
+                    continue
+                paper_data = fetched.get(arxiv_id)
+                if paper_data is None:
+                    continue
+                if paper_data.get('updated') == (entry.updated or entry.value.get('updated')):
+                    self.cache.refresh("id", arxiv_id, **(validators if len(chunk) == 1 else {}))
+                else:
+                    results[arxiv_id] = paper_data
+                    self.save_results(f"id:{arxiv_id}", paper_data,
+                                      **(validators if len(chunk) == 1 else {}))
+    
+    def _fetch_ids_splitting(self, chunk):
+        """_fetch_ids と同じだが、4xx で拒否されたら半分に分けて取り直す
         
+        arXiv は id_list に不正なIDが1件でもあるとリクエスト全体を拒否するため、
+        二分して残りのIDを救う。それでも拒否される1件は見つからなかったものとする。
+        """
+        try:
+            return self._fetch_ids(chunk)
+        except requests.RequestException as e:
+            if not is_client_error(e):
+                raise
+            if len(chunk) == 1:
+                st.warning(f"⚠️ arXivがIDを受け付けませんでした: {chunk[0]}")
+                return {}, {}
+        middle = len(chunk) // 2
+        fetched = {}
+        for part in (chunk[:middle], chunk[middle:]):
+            fetched.update(self._fetch_ids_splitting(part)[0])
+        return fetched, {}
+    
+    def _fetch_ids(self, chunk, headers=None):
+        """id_listで取得し、({ID: 論文データ}, 検証子) を返す
+        
+        条件付きリクエストで 304 が返った場合、論文データは None。
+        """
         # ID検索用のパラメータ
         params = {
-            'id_list': arxiv_id,
-            'max_results': 1
+            'id_list': ','.join(chunk),
+            'max_results': len(chunk)
         }
+        stream = self._fetch_stream(params, headers=headers)
+        validators = {
+            "etag": stream.headers.get("ETag"),
+            "last_modified": stream.headers.get("Last-Modified"),
+        }
+        if stream.status_code == 304:
+            stream.close()
+            return None, validators
         
+        # 返ってきたエントリを版なし・版ありの両方のIDで引けるようにする
+        fetched = {}
         try:
-            response = requests.get(self.api_base, params=params, timeout=30)
-            response.raise_for_status()
-            
-            # XMLパース
-            root = ET.fromstring(response.content)
-            
-            # 名前空間の設定
-            namespaces = {
-                'atom': 'http://www.w3.org/2005/Atom',
-                'arxiv': 'http://arxiv.org/schemas/atom'
-            }
-            
-            entry = root.find('atom:entry', namespaces)
-            if entry is None:
-                return None
-            
-            # メタデータの抽出
-            paper_data = {
-                'id': entry.find('atom:id', namespaces).text.split('/')[-1],
-                'title': entry.find('atom:title', namespaces).text.strip(),
-                'summary': entry.find('atom:summary', namespaces).text.strip(),
-                'published': entry.find('atom:published', namespaces).text,
-                'updated': entry.find('atom:updated', namespaces).text,
-                'authors': [author.find('atom:name', namespaces).text 
-                           for author in entry.findall('atom:author', namespaces)],
-                'categories': [cat.get('term') 
-                              for cat in entry.findall('atom:category', namespaces)]
-            }
-            
-            # URL情報を追加
-            paper_data['entry_id'] = f"http://arxiv.org/abs/{paper_data['id']}"
-            paper_data['pdf_url'] = f"http://arxiv.org/pdf/{paper_data['id']}.pdf"
-            
-            # 日付情報をdatetimeオブジェクトに変換
-            try:
-                paper_data['published_datetime'] = datetime.fromisoformat(paper_data['published'].replace('Z', '+00:00'))
-            except:
-                paper_data['published_datetime'] = datetime.now()
-            
-            # キャッシュに保存
-            self.save_results(cache_key, paper_data)
-            
-            return paper_data
-            
-        except Exception as e:
-            st.error(f"❌ ID検索エラー: {e}")
-            return None
+            for paper_data in self.telemetry.timed_iter(STAGE_PARSE, iter_entries(stream),
+                                                        source="id_list"):
+                fetched[paper_data['id']] = paper_data
+                fetched.setdefault(re.sub(r'v\d+$', '', paper_data['id']), paper_data)
+        finally:
+            stream.close()
+        self._remember(list(fetched.values()))
+        return fetched, validators
+    
+    def _count_lookups(self, hits=0, stale=0, misses=0):
+        """メタデータキャッシュの結果をプロセス全体のカウンタに足す"""
+        for result, count in (("hit", hits), ("stale", stale), ("miss", misses)):
+            if count:
+                self.telemetry.count("cache_lookups", count, cache="metadata", result=result)
+    
+    def _remember(self, papers):
+        """取得した論文を全文検索インデックスと埋め込みストアに登録する"""
+        self.index.add_many(papers)
+        new_papers = [paper for paper in papers if paper['id'] not in self.embeddings]
+        if new_papers:
+            vectors = self.embedder.embed([paper_text(paper) for paper in new_papers])
+            self.embeddings.add([paper['id'] for paper in new_papers], vectors)
+    
+    def similar_papers(self, paper, k=SIMILAR_SEARCH_K):
+        """埋め込みが近い順に [(論文ID, 類似度), ...] を返す（その論文自身は除く）"""
+        vector = self.embeddings.vector(paper['id'])
+        if vector is None:
+            vector = self.embedder.embed([paper_text(paper)])[0]
+        return self.embeddings.search(vector, k=k, exclude=[paper['id']])
     
     def search_by_title(self, title):
         """タイトルで論文を検索"""
         cache_key = f"title:{title}"
-        cached_result = self.get_cached_results(cache_key)
-        if cached_result:
-            st.info("🗄️ キャッシュから結果を取得しました")
-            return cached_result
-        
-        # まず完全一致検索を試行
-        query = f'ti:"{title}"'
-        result = self.search_arxiv_api(query, max_results=3)
+        with self.telemetry.span(STAGE_CACHE, cache="metadata", keys=1):
+            entry = self.cache.lookup("title", title)
+        if entry is not None and entry.value:
+            if entry.fresh:
+                self._count_lookups(hits=1)
+                st.info("🗄️ キャッシュから結果を取得しました")
+                count_cache_hits(1)
+                return entry.value
+            self._count_lookups(stale=1)
+            # 期限切れでも、その論文が更新されていなければ検索し直さない
+            if self._title_result_current(title, entry):
+                st.info("🗄️ キャッシュの結果が最新であることを確かめました")
+                count_cache_hits(1)
+                return entry.value
+        else:
+            self._count_lookups(misses=1)
         
-        if result:
+        # 過去に取得した論文から十分に一致するものがあれば、arXivに問い合わせない
+        local_match = self.index.find_title(title)
+        if local_match:
+            result, score = local_match
+            st.info(f"📚 ローカルインデックスから取得しました（一致度 {score:.2f}）")
             self.save_results(cache_key, result)
             return result
         
-        # 完全一致で見つからない場合、部分一致検索
-        st.info("🔍 完全一致で見つからなかったため、部分一致検索を実行中...")
-        result = self.search_arxiv_api(f"all:{title}", max_results=5)
+        # 同じタイトルの検索が実行中なら、その結果を共有する
+        return self.single_flight.do(
+            ("title", normalize_query(title)), lambda: self._search_title_remote(title)
+        )
+    
+    def _title_result_current(self, title, entry):
+        """タイトル検索の結果の論文が更新されていなければ、期限を延ばして True を返す"""
+        paper = entry.value
+        base_id = split_version(paper['id'])[0]
+        try:
+            fetched, _ = self.single_flight.do(("probe", (base_id,), ()),
+                                               lambda: self._fetch_ids([base_id]))
+        except Exception:
+            return False
+        latest = fetched.get(base_id)
+        if latest is None or latest.get('updated') != paper.get('updated'):
+            return False
+        self.cache.refresh("title", title)
+        return True
+    
+    def _search_title_remote(self, title):
+        """arXiv APIでタイトル検索し、見つかればキャッシュに保存"""
+        cache_key = f"title:{title}"
         
-        if result:
-            self.save_results(cache_key, result)
-            return result
+        # まずタイトルのフレーズ検索で候補を集め、一致度で順位付けする
+        candidates = self.search_arxiv_candidates(
+            f'ti:"{title}"', max_results=TITLE_CANDIDATES, sort_by='relevance'
+        )
+        best, confidence, shortlist = best_match(title, candidates)
         
-        return None
+        if best is None or confidence < CONFIDENCE_THRESHOLD:
+            # 一致度の高い候補がない場合、部分一致検索の候補も加えて選び直す
+            st.info("🔍 一致度の高い候補が見つからなかったため、部分一致検索を実行中...")
+            more = self.search_arxiv_candidates(
+                f"all:{title}", max_results=PARTIAL_MATCH_CANDIDATES, sort_by='relevance'
+            )
+            seen = {candidate['id'] for candidate in candidates}
+            candidates += [candidate for candidate in more if candidate['id'] not in seen]
+            best, confidence, shortlist = best_match(title, candidates)
+        
+        if best is None:
+            return None
+        
+        result = dict(best)
+        result['match'] = {
+            'confidence': confidence,
+            'alternatives': [{'id': c['id'], 'title': c['title']} for c in shortlist[1:]],
+        }
+        self.save_results(cache_key, result)
+        return result
 
 # キャッシュクラス
 class ArxivCache:
-    def __init__(self, cache_dir=CACHE_DIR):
+    def __init__(self, cache_dir=CACHE_DIR, cache=None):
         self.cache_dir = cache_dir
-        os.makedirs(cache_dir, exist_ok=True)
+        self.cache = cache if cache is not None else open_cache_store(cache_dir)
     
-    def get_cached_results(self, query, max_age_hours=24):
-        cache_path = os.path.join(self.cache_dir, f"{hash(query)}.pkl")
-        
-        if os.path.exists(cache_path):
-            mtime = datetime.fromtimestamp(os.path.getmtime(cache_path))
-            if datetime.now() - mtime < timedelta(hours=max_age_hours):
-                try:
-                    with open(cache_path, 'rb') as f:
-                        return pickle.load(f)
-                except Exception:
-                    os.remove(cache_path)
-        
-        return None
+    def get_cached_results(self, query, max_age_hours=None):
+        namespace, key = split_legacy_query(query)
+        max_age = None if max_age_hours is None else max_age_hours * 3600
+        return self.cache.get(namespace, key, max_age=max_age)
     
     def save_results(self, query, results):
-        cache_path = os.path.join(self.cache_dir, f"{hash(query)}.pkl")
+        namespace, key = split_legacy_query(query)
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(results, f)
+            self.cache.set(namespace, key, results)
         except Exception as e:
             st.warning(f"キャッシュ保存に失敗: {e}")
 
 # API設定とエラーハンドリング
 @st.cache_resource
 def initialize_apis():
-    """API初期化（キャッシュ）"""
+    """API初期化（キャッシュ）
+    
+    OpenAI・Slack・Notionのクライアントやキャッシュは、最初に使われたときに作る。
+    slack_sdk などの読み込みも遅らせ、使わない機能の分だけ起動が遅くならないようにする。
+    """
     config = load_config()
     
     try:
@@ -664,30 +552,51 @@ def initialize_apis():
         notion_key = config['api_keys']['notion']
         notion_db_url = config['settings']['notion_database_url']
         
-        # OpenAI初期化
-        openai.api_key = openai_key
-        
-        # Notion初期化
-        notion_client = Client(auth=notion_key)
-        
-        # Slack初期化
-        slack_client = WebClient(token=slack_token)
-        
-        # 改良されたarXiv検索クライアント
-        arxiv_search = ImprovedArxivSearch()
-        
-        return {
-            "openai_key": openai_key,
-            "slack_client": slack_client,
-            "notion_client": notion_client,
-            "notion_db_url": notion_db_url,
-            "arxiv_search": arxiv_search,
-            "cache": ArxivCache(),
-            "config": config
-        }
+        # 処理段階ごとの計測（全セッションで共有）
+        telemetry = open_telemetry(CACHE_DIR, log=bool(config['settings'].get('metrics_log')))
+        metrics_port = config['settings'].get('metrics_port')
+        if metrics_port:
+            try:
+                serve_metrics(telemetry, int(metrics_port))
+            except OSError as e:
+                st.warning(f"⚠️ メトリクスの公開に失敗しました: {e}")
     except Exception as e:
         st.error(f"⚠️ API初期化エラー: {e}")
         st.stop()
+    
+    def create_openai():
+        import openai
+        openai.api_key = openai_key
+        return openai
+    
+    def create_notion_client():
+        from notion_client import Client
+        return Client(auth=notion_key)
+    
+    def create_slack_client():
+        from slack_sdk import WebClient
+        return WebClient(token=slack_token)
+    
+    apis = LazyRegistry({
+        "openai": create_openai,
+        "notion_client": create_notion_client,
+        # Database IDをそのまま使用
+        "notion_writer": lambda: NotionWriter(apis["notion_client"], notion_db_url,
+                                              open_page_index(CACHE_DIR)),
+        "slack_client": create_slack_client,
+        "slack_delivery": lambda: SlackDeliveryQueue(apis["slack_client"], telemetry=telemetry),
+        # 検索クライアントとキャッシュクラスで同じキャッシュストアを共有
+        "cache_store": lambda: open_cache_store(CACHE_DIR),
+        # 改良されたarXiv検索クライアント
+        "arxiv_search": lambda: ImprovedArxivSearch(cache=apis["cache_store"],
+                                                    index=open_paper_index(CACHE_DIR),
+                                                    telemetry=telemetry),
+        "cache": lambda: ArxivCache(cache=apis["cache_store"]),
+        "summary_cache": lambda: open_summary_cache(CACHE_DIR),
+        "router": lambda: open_router(CACHE_DIR),
+        "pdf_cache": lambda: open_pdf_cache(CACHE_DIR),
+    }, openai_key=openai_key, notion_db_url=notion_db_url, telemetry=telemetry, config=config)
+    return apis
 
 def search_paper_by_title(title, apis):
     """タイトルで論文を検索"""
@@ -707,120 +616,359 @@ def search_paper_by_id(arxiv_id, apis):
         st.error(f"❌ 論文取得エラー: {e}")
         return None
 
-def get_summary(prompt, result, model, apis):
-    """論文要約を生成（修正版）"""
+def iter_summary_tokens(prompt, text, model, apis, params=None):
+    """要約をトークン単位で返すジェネレータ（閉じると上流のリクエストも止める）
+    
+    params はAPIに渡す出力上限と temperature（Route.request_params）。
+    """
+    if params is None:
+        params = {"temperature": SUMMARY_TEMPERATURE}
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": text},
+    ]
+    with apis["telemetry"].span(STAGE_LLM, model=model, stream=True) as span:
+        try:
+            # 古いAPI形式を先に試す
+            stream = apis["openai"].ChatCompletion.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **params,
+            )
+            def extract(chunk):
+                choice = chunk["choices"][0]
+                return choice["delta"].get("content"), choice.get("finish_reason")
+        except Exception:
+            # 新しいAPI形式でリトライ
+            client = apis["openai"].OpenAI(api_key=apis["openai_key"])
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **params,
+            )
+            def extract(chunk):
+                if not chunk.choices:
+                    return None, None
+                return chunk.choices[0].delta.content, chunk.choices[0].finish_reason
+        
+        parts = []
+        finish_reason = None
+        try:
+            for chunk in stream:
+                token, reason = extract(chunk)
+                finish_reason = reason or finish_reason
+                if token:
+                    parts.append(token)
+                    yield token
+            note = truncation_note(apis, span, model, finish_reason, "".join(parts))
+            if note:
+                yield note
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            # ストリームでは使用量が返らないため、送った・受け取ったテキストから数える
+            record_llm_usage(apis, span, model,
+                             count_tokens(prompt, model) + count_tokens(text, model),
+                             count_tokens("".join(parts), model), estimated=True)
+
+def stream_summary(prompt, text, model, apis, placeholder, timing, params=None):
+    """トークンが届くたびに placeholder へ描画し、最終的な要約を返す"""
+    start = time.perf_counter()
+    tokens = iter_summary_tokens(prompt, text, model, apis, params)
+    parts = []
+    last_render = 0.0
+    try:
+        for token in tokens:
+            now = time.perf_counter()
+            if not parts:
+                timing["ttft"] = now - start
+            parts.append(token)
+            # 描画は一定間隔に間引く
+            if now - last_render >= STREAM_RENDER_INTERVAL:
+                placeholder.markdown("".join(parts) + "▌")
+                last_render = now
+    finally:
+        # 再実行やページ離脱で中断された場合も上流のストリームを閉じる
+        tokens.close()
+    return "".join(parts)
+
+def get_summary(prompt, result, model, apis, placeholder=None, timing=None, routing=None,
+                full_text=False, progress=None):
+    """論文要約を生成（修正版）
+    
+    model が None ならルーターが入力トークン数と routing（min_tier・latency_slo）から選ぶ。
+    full_text=True ならPDF本文をチャンクごとに要約してからまとめ、進捗を progress に表示する。
+    placeholder を渡すとストリーミングで逐次描画する。
+    timing に辞書を渡すと初回トークンまで（ttft）と合計（total）の秒数、
+    ルーティング結果（route）、全文モードのチャンクごとの所要時間（chunks）を書き込む。
+    """
+    if timing is None:
+        timing = {}
     if not prompt.strip():
         st.error("❌ プロンプトが空です。")
         return None
         
+    start = time.perf_counter()
+    
+    # 自動選択ならモデルを決める（ログへの記録は実際に要約を依頼するときに行う）
+    router = apis["router"]
     text = f"title: {result['title']}\nbody: {result['summary']}"
+    route = None
+    if model is None:
+        route, sent_prompt, text = router.route(prompt, text, record=False, **(routing or {}))
+        model = route.model
+        timing["route"] = route.as_dict()
     
-    try:
-        # 古いAPI形式を先に試す
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": text},
-            ],
-            temperature=0.25,
-        )
-        summary = response["choices"][0]["message"]["content"]
-        
-    except Exception as e:
-        # 新しいAPI形式でリトライ
+    # 同じ論文・版・モデル・プロンプトの要約はキャッシュから返す
+    summary_cache = apis["summary_cache"]
+    cache_prompt = FULLTEXT_CACHE_TAG + prompt if full_text else prompt
+    cached_summary = lookup_summary(apis, result['id'], model, cache_prompt)
+    if cached_summary:
+        st.info("🗄️ キャッシュ済みの要約を表示します")
+        count_cache_hits(1)
+        timing["total"] = time.perf_counter() - start
+        return cached_summary
+    
+    if full_text:
+        text = summarize_full_text(result, model, apis, progress, timing)
+        if text is None:
+            return None
+        # まとめの入力もモデルの予算内に収める
+        route, sent_prompt, text = router.route(prompt, text, model=model, record=False)
+    elif route is None:
+        # 入力をモデルの予算内に収める
+        route, sent_prompt, text = router.route(prompt, text, model=model, record=False)
+    router.record_route(route)
+    timing["route"] = route.as_dict()
+    params = route.request_params(SUMMARY_TEMPERATURE)
+    
+    if placeholder is not None:
         try:
-            client = openai.OpenAI(api_key=apis["openai_key"])
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.25,
-                max_tokens=2000,
-            )
-            summary = response.choices[0].message.content
-        except Exception as e2:
-            st.error(f"❌ OpenAI APIエラー: {e2}")
+            summary = stream_summary(sent_prompt, text, model, apis, placeholder, timing, params)
+        except Exception as e:
+            st.error(f"❌ OpenAI APIエラー: {e}")
+            return None
+    else:
+        summary = complete_summary(sent_prompt, text, model, apis, params)
+        if summary is None:
             return None
+    timing["total"] = time.perf_counter() - start
+    router.record_usage(route, summary, timing["total"])
     
     if not summary:
         st.error("❌ 要約が生成されませんでした。")
         return None
     
+    # 途中で切れた要約はキャッシュせず、次回は生成し直す
+    if not summary.endswith(TRUNCATION_NOTE):
+        summary_cache.set(result['id'], model, cache_prompt, SUMMARY_TEMPERATURE, summary)
+    
     # サマリーのみを返す（メッセージフォーマットは後で追加）
     return summary
 
+def lookup_summary(apis, paper_id, model, prompt):
+    """要約キャッシュを引き、計測とヒット・ミスの集計も行う"""
+    with apis["telemetry"].span(STAGE_CACHE, cache="summary", keys=1):
+        summary = apis["summary_cache"].get(paper_id, model, prompt, SUMMARY_TEMPERATURE)
+    apis["telemetry"].count("cache_lookups", cache="summary", result="hit" if summary else "miss")
+    return summary
+
+def request_completion(prompt, text, model, apis, params=None):
+    """ストリーミングせずに要約を生成（失敗時は例外を送出。ワーカースレッドからも呼べる）"""
+    if params is None:
+        params = {"temperature": SUMMARY_TEMPERATURE}
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": text},
+    ]
+    with apis["telemetry"].span(STAGE_LLM, model=model, stream=False) as span:
+        try:
+            # 古いAPI形式を先に試す
+            response = apis["openai"].ChatCompletion.create(
+                model=model,
+                messages=messages,
+                **params,
+            )
+            content = response["choices"][0]["message"]["content"]
+            finish_reason = response["choices"][0].get("finish_reason")
+            usage = response.get("usage") or {}
+            prompt_tokens = usage.get("prompt_tokens")
+            completion_tokens = usage.get("completion_tokens")
+        except Exception:
+            # 新しいAPI形式でリトライ
+            client = apis["openai"].OpenAI(api_key=apis["openai_key"])
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                **params,
+            )
+            content = response.choices[0].message.content
+            finish_reason = response.choices[0].finish_reason
+            usage = getattr(response, "usage", None)
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+        
+        if prompt_tokens is None or completion_tokens is None:
+            record_llm_usage(apis, span, model,
+                             count_tokens(prompt, model) + count_tokens(text, model),
+                             count_tokens(content or "", model), estimated=True)
+        else:
+            record_llm_usage(apis, span, model, prompt_tokens, completion_tokens)
+        note = truncation_note(apis, span, model, finish_reason, content)
+        return content + note if note else content
+
+def truncation_note(apis, span, model, finish_reason, content):
+    """出力上限で止まった応答なら末尾に付ける注記を返す（本文が空なら例外を送出）"""
+    if finish_reason != "length":
+        return ""
+    span["truncated"] = True
+    apis["telemetry"].count("llm_truncated", model=model)
+    if not content:
+        # 推論モデルは出力上限を推論だけで使い切ると、本文が空のまま止まる
+        raise RuntimeError("出力トークンの上限に達し、要約が空でした（推論で上限を使い切った可能性があります）")
+    return TRUNCATION_NOTE
+
+def record_llm_usage(apis, span, model, prompt_tokens, completion_tokens, estimated=False):
+    """LLM呼び出しのトークン数をスパンの属性とプロセス全体のカウンタに残す"""
+    span.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                estimated_tokens=estimated)
+    telemetry = apis["telemetry"]
+    telemetry.count("llm_calls", model=model)
+    telemetry.count("llm_tokens", prompt_tokens, model=model, kind="prompt")
+    telemetry.count("llm_tokens", completion_tokens, model=model, kind="completion")
+
+def complete_summary(prompt, text, model, apis, params=None):
+    """ストリーミングせずに要約を生成"""
+    try:
+        return request_completion(prompt, text, model, apis, params)
+    except Exception as e:
+        st.error(f"❌ OpenAI APIエラー: {e}")
+        return None
+
+def summarize_paper(prompt, result, model, apis, routing=None):
+    """アブストラクトを要約し (要約, モデル, キャッシュから返したか) を返す
+    
+    画面には何も描画しないため、ワーカースレッドから呼べる（失敗時は例外を送出）。
+    """
+    router = apis["router"]
+    text = f"title: {result['title']}\nbody: {result['summary']}"
+    route = None
+    if model is None:
+        route, sent_prompt, text = router.route(prompt, text, record=False, **(routing or {}))
+        model = route.model
+    summary_cache = apis["summary_cache"]
+    cached_summary = lookup_summary(apis, result['id'], model, prompt)
+    if cached_summary:
+        return cached_summary, model, True
+    if route is None:
+        route, sent_prompt, text = router.route(prompt, text, model=model, record=False)
+    router.record_route(route)
+    start = time.perf_counter()
+    summary = request_completion(sent_prompt, text, model, apis,
+                                 route.request_params(SUMMARY_TEMPERATURE))
+    if not summary:
+        raise RuntimeError("要約が生成されませんでした")
+    router.record_usage(route, summary, time.perf_counter() - start)
+    if not summary.endswith(TRUNCATION_NOTE):
+        summary_cache.set(result['id'], model, prompt, SUMMARY_TEMPERATURE, summary)
+    return summary, model, False
+
+def format_summary_message(result, summary_text):
+    """Slack・画面表示用のメッセージ"""
+    date_str = result['published_datetime'].strftime("%Y-%m-%d %H:%M:%S")
+    return f"発行日: {date_str}\n{result['entry_id']}\n{result['title']}\n\n{summary_text}\n"
+
+def summary_record(result, summary_text):
+    """セッションに残す要約結果（Notion保存用のデータを含む）"""
+    return {
+        "paper_info": result,
+        "summary_text": summary_text,
+        "summary_message": format_summary_message(result, summary_text),
+        "summary_data": {
+            "title": result['title'],
+            "summary": summary_text,  # メッセージ全体ではなく要約テキストのみ
+            "url": result['entry_id'],
+            "date": result['published_datetime'].strftime("%Y-%m-%d"),
+        },
+    }
+
+def summarize_full_text(result, model, apis, progress=None, timing=None):
+    """PDF本文をチャンクに分けて並列に要約し、まとめ用の入力テキストを返す
+    
+    PDFはディスクキャッシュから開き、ページ・チャンクを順に読み進めるため
+    長い論文でもメモリ使用量は増えない。
+    """
+    search = apis["arxiv_search"]
+    map_route, _, _ = apis["router"].route(MAP_PROMPT, "", model=model)
+    
+    def summarize(chunk_text):
+        return request_completion(MAP_PROMPT, chunk_text, model, apis,
+                                  map_route.request_params(SUMMARY_TEMPERATURE))
+    
+    partials, rows = [], []
+    try:
+        pdf_path = apis["pdf_cache"].fetch(search.http, result['pdf_url'], result['id'],
+                                           rate_limiter=search.rate_limiter)
+        with open(pdf_path, "rb") as pdf_file:
+            chunks = iter_chunks(iter_page_texts(pdf_file), model)
+            for done in map_chunks(chunks, summarize, FULLTEXT_CONCURRENCY):
+                partials.append(done)
+                rows.append({
+                    "チャンク": done.chunk.index + 1,
+                    "範囲": done.chunk.label(),
+                    "秒": round(done.latency, 1),
+                    "状態": "✅" if done.summary else f"❌ {done.error}",
+                })
+                if progress is not None:
+                    progress.dataframe(rows, hide_index=True)
+    except requests.RequestException as e:
+        st.error(f"❌ PDFのダウンロードに失敗しました: {e}")
+        return None
+    except Exception as e:
+        st.error(f"❌ PDFの読み込みに失敗しました: {e}")
+        return None
+    finally:
+        if timing is not None:
+            timing["chunks"] = rows
+    
+    partials.sort(key=lambda p: p.chunk.index)
+    if not any(p.summary for p in partials):
+        st.error("❌ 本文の要約に失敗しました。")
+        return None
+    return build_reduce_text(result, partials)
+
 def add_summary_to_notion(summary_data, apis):
-    """Notionに要約を追加（動作確認済みのシンプル版）"""
+    """Notionに要約を追加（既存ページがあれば更新）"""
     try:
-        # Database IDをそのまま使用
-        notion_db_id = apis["notion_db_url"]
-        
-        # ページ作成データ
-        result = apis["notion_client"].pages.create(
-            parent={"database_id": notion_db_id},
-            properties={
-                "Name": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": summary_data["title"]
-                            }
-                        }
-                    ]
-                },
-                "Tags": {
-                    "multi_select": [
-                        {
-                            "name": "arXiv"
-                        }
-                    ]
-                },
-                "Published": {
-                    "date": {
-                        "start": summary_data["date"]
-                    }
-                },
-                "URL": {
-                    "url": summary_data["url"]
-                }
-            },
-            children=[
-                {
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [
-                            {
-                                "type": "text",
-                                "text": {
-                                    "content": summary_data["summary"][:2000]  # Notion制限
-                                }
-                            }
-                        ]
-                    }
-                }
-            ]
-        )
-        
-        return True, "Notionに保存されました"
+        with apis["telemetry"].span(STAGE_NOTION) as span:
+            page_id, created = apis["notion_writer"].save(summary_data)
+            span["created"] = created
+        if created:
+            return True, "Notionに保存されました"
+        return True, "既存のNotionページを更新しました"
         
     except Exception as e:
         return False, f"Notion API エラー: {str(e)}"
 
-def post_to_slack(message, apis):
-    """Slackにメッセージを投稿（動作確認済みのシンプル版）"""
+def post_to_slack(message, apis, thread_ts=None):
+    """Slackにメッセージを投稿（投稿キュー経由）
+    
+    SLACK_UI_WAIT 秒以内に終わらなければ、送信はバックグラウンドに任せて戻る。
+    """
+    from slack_sdk.errors import SlackApiError
     try:
         # チャンネル名を取得
         channel = apis["config"]["settings"].get("slack_channel", SLACK_CHANNEL)
         
-        # Slack投稿
-        response = apis["slack_client"].chat_postMessage(
-            channel=channel,
-            text=message
-        )
+        # Slack投稿（レート制限・一時的なエラーは投稿キューが再試行する）
+        future = apis["slack_delivery"].submit(channel, message, thread_ts=thread_ts)
+        try:
+            response = future.result(timeout=SLACK_UI_WAIT)
+        except FutureTimeoutError:
+            return True, "Slackへの投稿をキューに追加しました（バックグラウンドで送信します）"
         
         if response["ok"]:
             return True, "Slackに投稿されました"
@@ -832,6 +980,143 @@ def post_to_slack(message, apis):
     except Exception as e:
         return False, f"Slack投稿エラー: {str(e)}"
 
+def post_bulk_to_slack(messages, apis):
+    """複数の要約を1つのスレッドにまとめて投稿（投稿キュー経由）"""
+    from slack_sdk.errors import SlackApiError
+    try:
+        channel = apis["config"]["settings"].get("slack_channel", SLACK_CHANNEL)
+        delivery = apis["slack_delivery"]
+        thread_ts = delivery.start_thread(channel, f"論文のサマリです（{len(messages)}件）。")
+        futures = [delivery.submit(channel, message, thread_ts=thread_ts) for message in messages]
+    except SlackApiError as e:
+        return False, f"Slack API エラー: {e.response['error']}"
+    except Exception as e:
+        return False, f"Slack投稿エラー: {str(e)}"
+    
+    done, pending = wait(futures, timeout=SLACK_UI_WAIT)
+    failed = sum(1 for future in done
+                 if future.exception() is not None or not future.result()["ok"])
+    if failed:
+        return False, f"{failed} 件の投稿に失敗しました"
+    if pending:
+        return True, f"{len(done)} 件を投稿しました（残り {len(pending)} 件はバックグラウンドで送信します）"
+    return True, f"{len(messages)} 件をSlackのスレッドに投稿しました"
+
+def add_bulk_to_notion(records, apis, progress=None):
+    """複数の要約をNotionに保存し、(保存件数, エラーメッセージ一覧) を返す"""
+    saved, errors = 0, []
+    for i, record in enumerate(records):
+        success, msg = add_summary_to_notion(record["summary_data"], apis)
+        if success:
+            saved += 1
+        else:
+            errors.append(f"{record['paper_info']['id']}: {msg}")
+        if progress is not None:
+            progress.progress((i + 1) / len(records))
+    return saved, errors
+
+def run_bulk_summaries(papers, prompt, model, apis, routing, progress):
+    """複数の論文を並列に要約し、論文ごとの進捗表を更新しながら結果を返す"""
+    rows = [{"ID": paper['id'], "タイトル": paper['title'], "状態": "⏳ 待機中",
+             "秒": None, "モデル": ""} for paper in papers]
+    progress.dataframe(rows, hide_index=True)
+    
+    def summarize(paper):
+        start = time.perf_counter()
+        summary, used_model, cached = summarize_paper(prompt, paper, model, apis, routing)
+        return summary, used_model, cached, time.perf_counter() - start
+    
+    records = [None] * len(papers)
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as executor:
+        futures = {executor.submit(summarize, paper): i for i, paper in enumerate(papers)}
+        # 画面の更新はこのスレッドで、終わった順に行う
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                summary, used_model, cached, elapsed = future.result()
+            except Exception as e:
+                rows[i]["状態"] = f"❌ {e}"
+            else:
+                if cached:
+                    count_cache_hits(1)
+                rows[i].update({
+                    "状態": "🗄️ キャッシュ" if cached else "✅ 完了",
+                    "秒": round(elapsed, 1),
+                    "モデル": used_model,
+                })
+                records[i] = summary_record(papers[i], summary)
+            progress.dataframe(rows, hide_index=True)
+    return [record for record in records if record is not None], rows
+
+def run_bulk_mode(text, prompt, model, routing, apis):
+    """テキスト中のarXiv IDをまとめて取得・要約し、結果をセッションに保存"""
+    arxiv_ids = extract_arxiv_ids(text)
+    if not arxiv_ids:
+        st.error("❌ 入力からarXiv IDが見つかりませんでした。")
+        count_error(apis)
+        return
+    if len(arxiv_ids) > BULK_MAX_PAPERS:
+        st.warning(f"⚠️ {len(arxiv_ids)}件のIDが見つかりました。先頭の{BULK_MAX_PAPERS}件を処理します。")
+        arxiv_ids = arxiv_ids[:BULK_MAX_PAPERS]
+    
+    with st.spinner(f"🔍 {len(arxiv_ids)}件の論文をまとめて取得中..."):
+        found = apis["arxiv_search"].search_by_ids(arxiv_ids)
+    papers = [found[arxiv_id] for arxiv_id in arxiv_ids if found.get(arxiv_id)]
+    missing = [arxiv_id for arxiv_id in arxiv_ids if not found.get(arxiv_id)]
+    if missing:
+        st.warning(f"⚠️ 見つからなかったID: {', '.join(missing)}")
+    if not papers:
+        st.error("❌ 該当する論文が見つかりませんでした。入力内容を確認してください。")
+        count_error(apis)
+        return
+    
+    with st.spinner(f"🤖 {len(papers)}件の論文を要約中..."):
+        progress = st.empty()
+        records, rows = run_bulk_summaries(papers, prompt, model, apis, routing, progress)
+        progress.empty()
+    
+    failed = len(papers) - len(records)
+    if failed:
+        count_error(apis, failed)
+    st.session_state.bulk_results = {"records": records, "rows": rows}
+    st.session_state.pop("last_result", None)
+
+def display_bulk_results(apis):
+    """一括モードの結果と、まとめて共有するボタンを表示"""
+    bulk = st.session_state.bulk_results
+    records = bulk["records"]
+    
+    st.markdown(f"## 📋 要約結果（{len(records)}件）")
+    with st.expander("⏱️ 論文ごとの状態と所要時間"):
+        st.dataframe(bulk["rows"], hide_index=True)
+    for record in records:
+        with st.expander(f"📄 {record['paper_info']['title']}"):
+            st.markdown(record["summary_message"])
+    if not records:
+        return
+    
+    st.markdown("### 📤 まとめて共有")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button(f"📢 {len(records)}件をSlackに投稿", use_container_width=True, key="bulk_slack"):
+            with st.spinner("Slackに投稿中..."):
+                messages = [record["summary_message"] for record in records]
+                success, msg = post_bulk_to_slack(messages, apis)
+                if success:
+                    st.success(f"✅ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
+    
+    with col2:
+        if st.button(f"📝 {len(records)}件をNotionに保存", use_container_width=True, key="bulk_notion"):
+            progress = st.progress(0.0)
+            saved, errors = add_bulk_to_notion(records, apis, progress)
+            if saved:
+                st.success(f"✅ {saved} 件をNotionに保存しました")
+            for error in errors:
+                st.error(f"❌ {error}")
+
 def display_paper_info(result):
     """論文情報を表示"""
     st.markdown('<div class="paper-info-box">', unsafe_allow_html=True)
@@ -856,9 +1141,55 @@ def display_paper_info(result):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def display_alternatives(result):
+    """タイトル検索の一致度が低い場合、他の候補を表示"""
+    match = result.get('match')
+    if not match or not match['alternatives']:
+        return
+    with st.expander(f"🤔 一致度 {match['confidence']:.2f}：他の候補", expanded=True):
+        st.caption("目的の論文でなければ、IDを指定して検索し直してください。")
+        for alternative in match['alternatives']:
+            st.markdown(f"- `{alternative['id']}` {alternative['title']}")
+
+def display_similar_papers(result, apis):
+    """埋め込みが近い論文のうち、要約済みのものを表示"""
+    try:
+        neighbors = apis["arxiv_search"].similar_papers(result)
+        summarized = apis["summary_cache"].summarized_ids([paper_id for paper_id, _ in neighbors])
+    except Exception as e:
+        st.warning(f"関連論文の検索に失敗: {e}")
+        return
+    similar = [(paper_id, score) for paper_id, score in neighbors
+               if paper_id in summarized][:SIMILAR_PAPERS]
+    if not similar:
+        return
+    with st.expander(f"🔗 関連する要約済みの論文（{len(similar)}件）"):
+        for paper_id, score in similar:
+            paper = apis["arxiv_search"].index.get(paper_id)
+            title = paper['title'] if paper else ""
+            st.markdown(f"- `{paper_id}` {title}（類似度 {score:.2f}）")
+
+@st.cache_resource
+def load_style():
+    """CSSを読み込む（プロセスで1回だけ）"""
+    with open(STYLE_PATH, encoding="utf-8") as f:
+        return f.read()
+
+def apply_style():
+    """CSSを適用する
+    
+    静的ファイルの配信が有効なら、ブラウザがキャッシュするCSSファイルを参照する
+    タグだけを送る。無効なら再実行のたびに本文を埋め込む。
+    """
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="{STYLE_URL}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>\n{load_style()}</style>", unsafe_allow_html=True)
+
 def main():
     # 初期化
     apis = initialize_apis()
+    apply_style()
     
     # ヘッダー
     st.markdown("""
@@ -875,13 +1206,32 @@ def main():
         # GPTモデル選択
         selected_model_name = st.selectbox(
             "GPTモデルを選択してください:",
-            options=list(GPT_MODELS.keys()),
+            options=list(GPT_MODELS.keys()) + [AUTO_MODEL_LABEL],
             index=0
         )
-        selected_model = GPT_MODELS[selected_model_name]
+        # 自動選択（明示的に選んだときだけ）では None を渡し、ルーターに任せる
+        selected_model = GPT_MODELS.get(selected_model_name)
+        
+        routing = {}
+        if selected_model is None:
+            tier_name = st.select_slider("品質", options=list(QUALITY_TIERS.keys()), value="標準")
+            routing["min_tier"] = QUALITY_TIERS[tier_name]
+            routing["latency_slo"] = st.slider("応答時間の目標（秒）", 5, 120, 30, step=5)
         
         st.info(f"選択されたモデル: **{selected_model_name}**")
         
+        stream_mode = st.checkbox(
+            "⚡ 要約をストリーミング表示",
+            value=True,
+            help="生成されたトークンから順に表示します"
+        )
+        
+        full_text_mode = st.checkbox(
+            "📄 全文（PDF）を要約",
+            value=False,
+            help="PDF本文をチャンクごとに並列で要約してからまとめます（時間と料金がかかります）"
+        )
+        
         st.markdown("---")
         st.markdown("### 📊 統計情報")
         if 'search_count' not in st.session_state:
@@ -894,6 +1244,34 @@ def main():
         st.metric("検索回数", st.session_state.search_count)
         st.metric("エラー回数", st.session_state.error_count)
         st.metric("キャッシュヒット", st.session_state.cache_hits)
+        st.caption("全セッションの処理段階ごとの所要時間は運用ダッシュボードで確認できます")
+        
+        summary_stats = apis["summary_cache"].stats()
+        st.metric("要約キャッシュ ヒット / ミス", f"{summary_stats['hits']} / {summary_stats['misses']}")
+        st.caption(f"キャッシュ済み要約: {summary_stats['entries']} 件")
+        if selected_model and st.button("🗑️ このモデルの要約キャッシュを削除",
+                                        key="clear_summary_cache"):
+            removed = apis["summary_cache"].invalidate(model=selected_model)
+            st.success(f"{removed} 件の要約キャッシュを削除しました")
+        
+        # 検索クライアントとPDFキャッシュは最初の検索で作られるので、それまでは表示しない
+        if apis.built("arxiv_search"):
+            http_stats = apis["arxiv_search"].http.connection_stats()
+            st.metric("arXiv接続 新規 / 再利用",
+                      f"{http_stats['new_connections']} / {http_stats['reused_connections']}")
+            st.caption(f"arXiv転送量: {http_stats['bytes_received'] / 1024:.1f} KB "
+                       f"（展開後 {http_stats['bytes_decoded'] / 1024:.1f} KB）")
+            
+            cache_stats = apis["arxiv_search"].cache.stats()
+            st.metric("メタデータ ヒット / 再検証 / 再取得",
+                      f"{cache_stats['hits']} / {cache_stats['revalidated']} / {cache_stats['refetched']}")
+        
+        pdf_stats = apis["pdf_cache"].stats() if apis.built("pdf_cache") else None
+        if pdf_stats and pdf_stats["hits"] + pdf_stats["revalidated"] + pdf_stats["misses"]:
+            st.metric("PDFキャッシュ ヒット率", f"{pdf_stats['hit_ratio']:.0%}")
+            st.caption(f"PDF: 再検証 {pdf_stats['revalidated']} 件 / "
+                       f"節約 {pdf_stats['bytes_saved'] / 1024 / 1024:.1f} MB / "
+                       f"保存 {pdf_stats['entries']} 件（{pdf_stats['bytes'] / 1024 / 1024:.1f} MB）")
 
     # メインコンテンツ
     col1, col2 = st.columns([2, 1])
@@ -903,7 +1281,7 @@ def main():
         st.markdown('<div class="search-method-container">', unsafe_allow_html=True)
         search_method = st.radio(
             "論文の指定方法を選択してください:",
-            ["タイトルで検索", "URLまたはIDで指定"],
+            ["タイトルで検索", "URLまたはIDで指定", BULK_METHOD],
             horizontal=True
         )
         st.markdown('</div>', unsafe_allow_html=True)
@@ -915,6 +1293,16 @@ def main():
                 placeholder="例: Attention Is All You Need",
                 help="論文の正確なタイトルを入力してください。部分一致でも検索できます。"
             )
+        elif search_method == BULK_METHOD:
+            paper_input = st.text_area(
+                "📚 URLの一覧・BibTeX・文章を貼り付けてください:",
+                height=200,
+                placeholder="例:\nhttps://arxiv.org/abs/1706.03762\narXiv:1810.04805\n@article{...eprint={2005.14165}...}",
+                help=f"含まれるarXiv IDをすべて抜き出して要約します（最大{BULK_MAX_PAPERS}件）。"
+            )
+            uploaded = st.file_uploader("またはBibTeX・テキストファイルを選択:", type=["bib", "txt"])
+            if uploaded is not None:
+                paper_input += "\n" + uploaded.getvalue().decode("utf-8", errors="ignore")
         else:
             paper_input = st.text_input(
                 "🔗 arXivのURLまたはIDを入力してください:",
@@ -962,14 +1350,24 @@ def main():
         paper_input = st.session_state.paper_input
         del st.session_state.paper_input
 
+    # 一括モード
+    if search_clicked and search_method == BULK_METHOD:
+        if not paper_input.strip():
+            st.error("❌ URLの一覧・BibTeXなどを入力してください。")
+            return
+        st.session_state.search_count += 1
+        apis["telemetry"].count("searches", mode="bulk")
+        run_bulk_mode(paper_input, custom_prompt, selected_model, routing, apis)
+
     # 検索実行
-    if search_clicked:
+    elif search_clicked:
         if not paper_input.strip():
             st.error("❌ 論文のタイトルまたはURLを入力してください。")
             return
 
         # 検索カウント更新
         st.session_state.search_count += 1
+        apis["telemetry"].count("searches", mode="single")
 
         # 論文検索
         with st.spinner("🔍 論文を検索中..."):
@@ -979,46 +1377,49 @@ def main():
                 arxiv_id = apis["arxiv_search"].extract_arxiv_id_from_url(paper_input.strip())
                 if not arxiv_id:
                     st.error("❌ 有効なarXiv URLまたはIDを入力してください。")
-                    st.session_state.error_count += 1
+                    count_error(apis)
                     return
                 result = search_paper_by_id(arxiv_id, apis)
             
             if not result:
                 st.error("❌ 該当する論文が見つかりませんでした。入力内容を確認してください。")
-                st.session_state.error_count += 1
+                count_error(apis)
                 return
 
         # 論文情報表示
         st.markdown('<div class="success-message">✅ 論文が見つかりました！</div>', unsafe_allow_html=True)
         display_paper_info(result)
+        display_alternatives(result)
+        display_similar_papers(result, apis)
 
         # 要約生成
         with st.spinner(f"🤖 {selected_model_name}で要約中..."):
-            summary_text = get_summary(custom_prompt, result, selected_model, apis)
+            chunk_progress = st.empty() if full_text_mode else None
+            live_placeholder = st.empty() if stream_mode else None
+            timing = {}
+            summary_text = get_summary(custom_prompt, result, selected_model, apis,
+                                       placeholder=live_placeholder, timing=timing,
+                                       routing=routing, full_text=full_text_mode,
+                                       progress=chunk_progress)
+            if chunk_progress is not None:
+                chunk_progress.empty()
+            if live_placeholder is not None:
+                # 完成した要約は下の結果表示で描画する
+                live_placeholder.empty()
             
             if not summary_text:
                 st.error("❌ 要約の生成に失敗しました。")
-                st.session_state.error_count += 1
+                count_error(apis)
                 return
 
-            # フォーマット済みメッセージの作成
-            date_str = result['published_datetime'].strftime("%Y-%m-%d %H:%M:%S")
-            summary_message = f"発行日: {date_str}\n{result['entry_id']}\n{result['title']}\n\n{summary_text}\n"
-            
             # セッション状態に保存（ボタンを押しても消えないように）
-            st.session_state.last_result = {
-                "paper_info": result,
-                "summary_text": summary_text,
-                "summary_message": summary_message,
-                "summary_data": {
-                    "title": result['title'],
-                    "summary": summary_text,  # メッセージ全体ではなく要約テキストのみ
-                    "url": result['entry_id'],
-                    "date": result['published_datetime'].strftime("%Y-%m-%d"),
-                }
-            }
+            st.session_state.last_result = dict(summary_record(result, summary_text), timing=timing)
+            st.session_state.pop("bulk_results", None)
 
     # 結果表示（セッション状態から）
+    if 'bulk_results' in st.session_state:
+        display_bulk_results(apis)
+    
     if 'last_result' in st.session_state:
         result_data = st.session_state.last_result
         
@@ -1027,6 +1428,22 @@ def main():
         st.markdown('<div class="summary-box">', unsafe_allow_html=True)
         st.markdown(result_data["summary_message"])
         st.markdown('</div>', unsafe_allow_html=True)
+        
+        timing = result_data.get("timing", {})
+        if "total" in timing:
+            if "ttft" in timing:
+                st.caption(f"⏱️ 最初のトークンまで {timing['ttft']:.1f}秒 / 合計 {timing['total']:.1f}秒")
+            else:
+                st.caption(f"⏱️ 合計 {timing['total']:.1f}秒")
+        route = timing.get("route")
+        if route:
+            st.caption(f"🧭 {route['model']}（{route['reason']}）/ 入力 {route['input_tokens']} トークン"
+                       f" / 出力見込み {route['output_tokens']} トークン")
+            if route['trimmed']:
+                st.warning("⚠️ 入力がトークン予算を超えたため、末尾を省略して要約しました。")
+        if timing.get("chunks"):
+            with st.expander(f"📄 チャンクごとの所要時間（{len(timing['chunks'])}件）"):
+                st.dataframe(timing["chunks"], hide_index=True)
 
         # アクションボタン
         st.markdown("### 📤 共有オプション")
@@ -1057,6 +1474,7 @@ def main():
     st.markdown("""
     - **タイトル検索**: 論文のタイトルを正確に入力してください（部分一致も可能）
     - **URL/ID指定**: `https://arxiv.org/abs/1234.5678` 形式のURLまたは `1234.5678` 形式のIDが使用できます
+    - **一括指定**: URLの一覧やBibTeXを貼り付けると、含まれる論文をまとめて要約できます
     - **プロンプト**: 要約スタイルを変更したい場合は「プロンプトをカスタマイズ」から編集してください
     - **モデル選択**: 用途に応じてGPTモデルを選択してください
     """)
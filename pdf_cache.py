@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from summary_cache import split_version
+
+PDF_CACHE_DIR = "pdfs"
+PDF_CACHE_DB_NAME = "pdf_cache.sqlite3"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+VERSIONED_MAX_AGE = 30 * 86400  # 版つきのPDFは基本的に変わらない
+LATEST_MAX_AGE = 86400          # 版なし（最新版）のPDFは1日で再検証する
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PARTIAL_MAX_AGE = 3600  # これより古い .part は書き手がいなくなった書きかけとみなす
+PDF_MAGIC = b"%PDF-"
+
+
+class PdfCache:
+    """arXiv IDと版をキーにしたPDFのディスクキャッシュ
+
+    ダウンロードは同じディレクトリの一時ファイルに書いてから置き換えるため、
+    読み手が書きかけのファイルを見ることはない。期限を過ぎたファイルは
+    ETag / Last-Modified を使った条件付きGETで確かめ、304 なら再取得しない。
+    合計サイズが max_bytes を超えたら最後に使われたのが古い順に消す。
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES,
+                 versioned_max_age=VERSIONED_MAX_AGE, latest_max_age=LATEST_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.versioned_max_age = versioned_max_age
+        self.latest_max_age = latest_max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._remove_partial_files()
+        self._conn = sqlite3.connect(os.path.join(directory, PDF_CACHE_DB_NAME), timeout=30,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdfs (
+                paper_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                validated_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (paper_id, version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pdfs_access ON pdfs(last_access)")
+        self._conn.commit()
+
+    def _remove_partial_files(self):
+        # 前回の書きかけを掃除する（他のプロセスがダウンロード中のものは残す）
+        cutoff = time.time() - PARTIAL_MAX_AGE
+        for name in os.listdir(self.directory):
+            if name.endswith(".part"):
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _filename(self, base, version):
+        # 旧形式のID（hep-th/9901001）はスラッシュを置き換える
+        return f"{base.replace('/', '_')}{version}.pdf"
+
+    def _is_valid(self, path, size):
+        try:
+            if os.path.getsize(path) != size:
+                return False
+            with open(path, "rb") as f:
+                return f.read(len(PDF_MAGIC)) == PDF_MAGIC
+        except OSError:
+            return False
+
+    def _lookup(self, base, version):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT filename, size, etag, last_modified, validated_at FROM pdfs "
+                "WHERE paper_id = ? AND version = ?",
+                (base, version),
+            ).fetchone()
+
+    def _touch(self, base, version, validated=False, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._conn.execute(
+                    "UPDATE pdfs SET last_access = ?, validated_at = ?, "
+                    "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                    "WHERE paper_id = ? AND version = ?",
+                    (now, now, etag, last_modified, base, version),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE pdfs SET last_access = ? WHERE paper_id = ? AND version = ?",
+                    (now, base, version),
+                )
+            self._conn.commit()
+
+    def fetch(self, http, url, paper_id, rate_limiter=None):
+        """PDFのローカルパスを返す（必要なときだけダウンロード・再検証する）"""
+        base, version = split_version(paper_id)
+        row = self._lookup(base, version)
+        headers = {}
+        if row is not None:
+            filename, size, etag, last_modified, validated_at = row
+            path = os.path.join(self.directory, filename)
+            if self._is_valid(path, size):
+                max_age = self.versioned_max_age if version else self.latest_max_age
+                if time.time() - validated_at < max_age:
+                    self._touch(base, version)
+                    self._count(hits=1, bytes_saved=size)
+                    return path
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        with http.get_stream(url, headers=headers) as stream:
+            if stream.status_code == 304 and row is not None:
+                self._touch(base, version, validated=True, etag=stream.headers.get("ETag"),
+                            last_modified=stream.headers.get("Last-Modified"))
+                self._count(revalidated=1, bytes_saved=row[1])
+                return os.path.join(self.directory, row[0])
+            filename = self._filename(base, version)
+            size = self._write_atomically(stream, filename)
+            etag = stream.headers.get("ETag")
+            last_modified = stream.headers.get("Last-Modified")
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pdfs (paper_id, version, filename, size, etag, "
+                "last_modified, validated_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (base, version, filename, size, etag, last_modified, now, now),
+            )
+            self._conn.commit()
+        self._count(misses=1, bytes_downloaded=size)
+        self._evict(keep=(base, version))
+        return os.path.join(self.directory, filename)
+
+    def _write_atomically(self, stream, filename):
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".part", delete=False) as f:
+            temp_path = f.name
+            try:
+                size = 0
+                while True:
+                    data = stream.read(DOWNLOAD_CHUNK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                    size += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.close()
+                os.remove(temp_path)
+                raise
+        try:
+            with open(temp_path, "rb") as f:
+                if f.read(len(PDF_MAGIC)) != PDF_MAGIC:
+                    raise ValueError(f"downloaded file is not a PDF: {filename}")
+            os.replace(temp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+
+    def _count(self, hits=0, revalidated=0, misses=0, bytes_saved=0, bytes_downloaded=0):
+        with self._lock:
+            self.hits += hits
+            self.revalidated += revalidated
+            self.misses += misses
+            self.bytes_saved += bytes_saved
+            self.bytes_downloaded += bytes_downloaded
+
+    def _evict(self, keep):
+        """合計サイズが上限を超えていれば、最後に使われたのが古い順に消す"""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pdfs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute(
+                "SELECT paper_id, version, filename, size FROM pdfs ORDER BY last_access"
+            ).fetchall()
+            for paper_id, version, filename, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if (paper_id, version) == keep:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM pdfs WHERE paper_id = ? AND version = ?",
+                                   (paper_id, version))
+                total -= size
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pdfs"
+            ).fetchone()
+            requests = self.hits + self.revalidated + self.misses
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.revalidated) / requests if requests else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "bytes_downloaded": self.bytes_downloaded,
+                "entries": entries,
+                "bytes": total,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_pdf_cache(cache_dir, **kwargs):
+    """cache_dir 配下のPDFキャッシュを開く"""
+    return PdfCache(os.path.join(cache_dir, PDF_CACHE_DIR), **kwargs)
@@ -0,0 +1,127 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+LEDGER_DB_NAME = "posted.sqlite3"
+DEFAULT_CAPACITY = 100000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_MAX_AGE_DAYS = 180
+
+_VERSION_RE = re.compile(r"v\d+$")
+
+
+class BloomFilter:
+    """ビット配列によるBloomフィルタ（偽陽性はあるが偽陰性はない）"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # 2つのハッシュ値の線形結合で k 個の位置を作る（ダブルハッシュ法）
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+def ledger_key(paper_id, channel):
+    # 版が変わっても同じ論文として扱う
+    return f"{channel}\t{_VERSION_RE.sub('', paper_id)}"
+
+
+class PostedLedger:
+    """投稿済みの (arXiv ID, チャンネル) の台帳
+
+    メモリ上のBloomフィルタで大半の「未投稿」を即答し、
+    フィルタが「投稿済みかも」と答えたときだけSQLiteで確かめる。
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS posted (
+                paper_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                posted_at REAL NOT NULL,
+                PRIMARY KEY (paper_id, channel)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_posted_at ON posted(posted_at)")
+        self._conn.commit()
+        self._rebuild_filter()
+
+    def _rebuild_filter(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM posted").fetchone()[0]
+            self._bloom = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+            for paper_id, channel in self._conn.execute("SELECT paper_id, channel FROM posted"):
+                self._bloom.add(ledger_key(paper_id, channel))
+
+    def seen(self, paper_id, channel):
+        """そのチャンネルに投稿済みかどうか"""
+        key = ledger_key(paper_id, channel)
+        with self._lock:
+            if key not in self._bloom:
+                return False
+            row = self._conn.execute(
+                "SELECT 1 FROM posted WHERE paper_id = ? AND channel = ?",
+                (_VERSION_RE.sub('', paper_id), channel),
+            ).fetchone()
+        return row is not None
+
+    def filter_unseen(self, papers, channel):
+        """未投稿の論文だけを返す"""
+        return [paper for paper in papers if not self.seen(paper['id'], channel)]
+
+    def record(self, paper_id, channel):
+        """投稿済みとして記録"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO posted (paper_id, channel, posted_at) VALUES (?, ?, ?)",
+                (_VERSION_RE.sub('', paper_id), channel, time.time()),
+            )
+            self._conn.commit()
+            self._bloom.add(ledger_key(paper_id, channel))
+
+    def prune(self, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """古い記録を削除してフィルタを作り直し、削除件数を返す"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM posted WHERE posted_at < ?", (time.time() - max_age_days * 86400,)
+            )
+            self._conn.commit()
+            removed = cursor.rowcount
+        if removed:
+            self._rebuild_filter()
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_ledger(cache_dir, **kwargs):
+    """cache_dir 配下の投稿台帳を開く"""
+    return PostedLedger(os.path.join(cache_dir, LEDGER_DB_NAME), **kwargs)
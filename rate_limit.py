@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット
+
+    rate は1秒あたりに補充されるトークン数、capacity はバースト許容量。
+    トークンが足りない場合は予約して順番が来るまで待つため、
+    同時に呼ばれても間隔が詰まることはない。
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得し、待った秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同じキーの処理が実行中なら、新たに実行せずその結果を共有する"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared_count = 0
+
+    def do(self, key, fn):
+        """fn() を実行して結果を返す（実行中の同一キーがあればその結果を待つ）"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared_count += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
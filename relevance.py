@@ -0,0 +1,180 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+EMBEDDING_DB_NAME = "embeddings.sqlite3"
+HASHING_DIM = 512
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+EMBED_BATCH_SIZE = 100
+
+_TOKEN_RE = re.compile(r"\w+")
+_VERSION_RE = re.compile(r"v\d+$")
+
+
+def paper_text(paper):
+    """埋め込みに使う論文のテキスト（タイトル＋アブストラクト）"""
+    return f"{paper.get('title', '')}\n{paper.get('summary', '')}"
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class HashingEmbedder:
+    """外部APIを使わない決定的な埋め込み（単語・bigramの特徴ハッシング）"""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                # 符号付きハッシュで衝突の偏りを打ち消す
+                matrix[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        # 頻度の偏りをならす
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        return normalize_rows(matrix)
+
+
+class OpenAIEmbedder:
+    """OpenAIの埋め込みAPI（まとめて1リクエストで送る）"""
+
+    def __init__(self, api_key, model=OPENAI_EMBEDDING_MODEL):
+        self.api_key = api_key
+        self.model = model
+        self.name = f"openai-{model}"
+
+    def _embed_batch(self, texts):
+        import openai
+        try:
+            # 古いAPI形式を先に試す
+            response = openai.Embedding.create(model=self.model, input=texts, api_key=self.api_key)
+            return [item["embedding"] for item in response["data"]]
+        except Exception:
+            # 新しいAPI形式でリトライ
+            client = openai.OpenAI(api_key=self.api_key)
+            response = client.embeddings.create(model=self.model, input=texts)
+            return [item.embedding for item in response.data]
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors.extend(self._embed_batch(texts[start:start + EMBED_BATCH_SIZE]))
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+class EmbeddingCache:
+    """論文ごとの埋め込みの永続キャッシュ（埋め込み方式ごとに別管理）"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                paper_id TEXT NOT NULL,
+                embedder TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (paper_id, embedder)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, paper_ids, embedder_name):
+        """{論文ID: ベクトル} を返す（キャッシュにあるものだけ）"""
+        found = {}
+        with self._lock:
+            for paper_id in paper_ids:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE paper_id = ? AND embedder = ?",
+                    (paper_id, embedder_name),
+                ).fetchone()
+                if row is not None:
+                    found[paper_id] = np.frombuffer(row[0], dtype=np.float32)
+        return found
+
+    def set_many(self, items, embedder_name):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (paper_id, embedder, vector, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(paper_id, embedder_name, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                 for paper_id, vector in items],
+            )
+            self._conn.commit()
+
+
+class RelevanceRanker:
+    """興味プロファイルとの類似度で論文を順位付けする
+
+    プロファイルは複数の文の埋め込みからなり、各論文のスコアは最も近い文との
+    コサイン類似度。候補全体のスコアは1回の行列積で求める。
+    主の埋め込みが失敗した場合は fallback で順位付けし直す。
+    """
+
+    def __init__(self, embedder, profile, cache=None, fallback=None):
+        self.embedder = embedder
+        self.profile = list(profile)
+        self.cache = cache
+        self.fallback = fallback
+        self._profile_vectors = {}
+
+    def _profile_matrix(self, embedder):
+        if embedder.name not in self._profile_vectors:
+            self._profile_vectors[embedder.name] = embedder.embed(self.profile)
+        return self._profile_vectors[embedder.name]
+
+    def embed_papers(self, papers, embedder):
+        """論文の埋め込み行列を返す（キャッシュにないものだけまとめて計算）"""
+        ids = [_VERSION_RE.sub('', paper['id']) for paper in papers]
+        cached = self.cache.get_many(ids, embedder.name) if self.cache is not None else {}
+        missing = [i for i, paper_id in enumerate(ids) if paper_id not in cached]
+        if missing:
+            vectors = embedder.embed([paper_text(papers[i]) for i in missing])
+            new_items = [(ids[i], vector) for i, vector in zip(missing, vectors)]
+            cached.update(new_items)
+            if self.cache is not None:
+                self.cache.set_many(new_items, embedder.name)
+        return np.vstack([cached[paper_id] for paper_id in ids])
+
+    def score(self, papers, embedder=None):
+        embedder = embedder or self.embedder
+        matrix = self.embed_papers(papers, embedder)
+        return (matrix @ self._profile_matrix(embedder).T).max(axis=1)
+
+    def rank(self, papers, top_k):
+        """関連度の高い順に上位 top_k 件を [(論文, スコア), ...] で返す"""
+        if not papers:
+            return []
+        try:
+            scores = self.score(papers)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"Embedding failed ({e}); falling back to {self.fallback.name}")
+            scores = self.score(papers, self.fallback)
+        top_k = min(top_k, len(papers))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(papers[i], float(scores[i])) for i in top]
+
+
+def open_embedding_cache(cache_dir):
+    """cache_dir 配下の埋め込みキャッシュを開く"""
+    return EmbeddingCache(os.path.join(cache_dir, EMBEDDING_DB_NAME))
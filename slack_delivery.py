@@ -0,0 +1,171 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from telemetry import STAGE_SLACK
+
+# chat.postMessage は1チャンネルあたり概ね1秒に1件まで
+DEFAULT_MIN_INTERVAL = 1.0
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# 再試行すれば成功する可能性があるSlackのエラーコード
+TRANSIENT_ERRORS = {
+    "ratelimited", "internal_error", "fatal_error", "service_unavailable",
+    "request_timeout",
+}
+
+
+def retry_after_seconds(error):
+    """429レスポンスの Retry-After ヘッダ（秒）を返す（なければ None）"""
+    response = getattr(error, "response", None)
+    if response is None or getattr(response, "status_code", None) != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    for name in ("Retry-After", "retry-after"):
+        value = headers.get(name)
+        if value is not None:
+            if isinstance(value, (list, tuple)):
+                value = value[0]
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def is_transient(error):
+    """再試行すべきエラーかどうか"""
+    # slack_sdk の読み込みは重いので、エラーが起きたときだけ行う
+    from slack_sdk.errors import SlackApiError
+    if isinstance(error, SlackApiError):
+        response = error.response
+        status = getattr(response, "status_code", 200)
+        if status == 429 or status >= 500:
+            return True
+        try:
+            return response.get("error") in TRANSIENT_ERRORS
+        except Exception:
+            return False
+    # ネットワーク断やタイムアウト（URLError・socket.timeout も含む）
+    return isinstance(error, OSError)
+
+
+class _Delivery:
+    def __init__(self, channel, text, thread_ts, kwargs):
+        self.channel = channel
+        self.text = text
+        self.thread_ts = thread_ts
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class SlackDeliveryQueue:
+    """WebClient の前段に置く投稿キュー
+
+    - 投稿は1本のワーカースレッドで投入順に送る（n本目の順番が崩れない）
+    - チャンネルごとに min_interval 秒以上の間隔を空ける
+    - 429 は Retry-After に従い、一時的なエラーはジッタ付き指数バックオフで再試行
+    submit は Future を返すので、呼び出し側は投稿完了を待たずに進める。
+    telemetry を渡すと、投稿1件ごとの送信時間（再試行を含む）をスパンとして記録する。
+    """
+
+    def __init__(self, client, min_interval=DEFAULT_MIN_INTERVAL, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, telemetry=None):
+        self.client = client
+        self.telemetry = telemetry
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.post_times = []
+        self.retries = 0
+        self._next_slot = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+
+    def submit(self, channel, text, thread_ts=None, **kwargs):
+        """投稿をキューに入れ、Slackのレスポンスを結果に持つ Future を返す"""
+        delivery = _Delivery(channel, text, thread_ts, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("delivery queue is closed")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="slack-delivery",
+                                                daemon=True)
+                self._worker.start()
+            self._queue.put(delivery)
+        return delivery.future
+
+    def post(self, channel, text, thread_ts=None, timeout=None, **kwargs):
+        """投稿して完了まで待つ"""
+        return self.submit(channel, text, thread_ts=thread_ts, **kwargs).result(timeout)
+
+    def start_thread(self, channel, text):
+        """親メッセージを投稿し、返信先として使う ts を返す"""
+        return self.post(channel, text)["ts"]
+
+    def close(self, wait=True):
+        """新規の投稿を締め切り、wait=True なら残りの送信が終わるまで待つ"""
+        with self._lock:
+            self._closed = True
+            worker = self._worker
+            if worker is not None:
+                self._queue.put(None)
+        if wait and worker is not None:
+            worker.join()
+
+    def _run(self):
+        while True:
+            delivery = self._queue.get()
+            if delivery is None:
+                return
+            if not delivery.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.telemetry is not None:
+                    with self.telemetry.span(STAGE_SLACK, channel=delivery.channel):
+                        response = self._deliver(delivery)
+                else:
+                    response = self._deliver(delivery)
+            except BaseException as e:
+                delivery.future.set_exception(e)
+            else:
+                self.post_times.append(time.perf_counter() - delivery.submitted_at)
+                delivery.future.set_result(response)
+
+    def _wait_for_slot(self, channel):
+        now = time.monotonic()
+        wait = self._next_slot.get(channel, 0.0) - now
+        if wait > 0:
+            time.sleep(wait)
+        self._next_slot[channel] = max(now, self._next_slot.get(channel, 0.0)) + self.min_interval
+
+    def _deliver(self, delivery):
+        attempt = 0
+        while True:
+            self._wait_for_slot(delivery.channel)
+            try:
+                kwargs = dict(delivery.kwargs)
+                if delivery.thread_ts:
+                    kwargs["thread_ts"] = delivery.thread_ts
+                return self.client.chat_postMessage(
+                    channel=delivery.channel, text=delivery.text, **kwargs
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    # フルジッタの指数バックオフ
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                # 次の送信枠をずらすことで、同じチャンネルの後続も待たせる
+                self._next_slot[delivery.channel] = time.monotonic() + delay
+                attempt += 1
+                self.retries += 1
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SUMMARY_DB_NAME = "summaries.sqlite3"
+
+
+def prompt_digest(prompt):
+    """プロンプト本文のダイジェスト（前後の空白は無視）"""
+    return hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest()
+
+
+def split_version(paper_id):
+    """"1706.03762v7" -> ("1706.03762", "v7")（版がなければ "")"""
+    base, sep, version = paper_id.rpartition("v")
+    if sep and base and version.isdigit() and not base.endswith("/"):
+        return base, f"v{version}"
+    return paper_id, ""
+
+
+class SummaryCache:
+    """LLM要約の永続キャッシュ
+
+    キーは (arXiv ID, 版, モデルID, プロンプトのダイジェスト, temperature)。
+    論文が改訂されれば版が変わるため自動的にミスになる。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                paper_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_digest TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (paper_id, version, model, prompt_digest, temperature)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_model ON summaries(model)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summaries_prompt ON summaries(prompt_digest)"
+        )
+        self._conn.commit()
+
+    def _key(self, paper_id, model, prompt, temperature):
+        base, version = split_version(paper_id)
+        return (base, version, model, prompt_digest(prompt), float(temperature))
+
+    def get(self, paper_id, model, prompt, temperature):
+        """キャッシュ済みの要約を返す（なければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE paper_id = ? AND version = ? "
+                "AND model = ? AND prompt_digest = ? AND temperature = ?",
+                self._key(paper_id, model, prompt, temperature),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, paper_id, model, prompt, temperature, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries "
+                "(paper_id, version, model, prompt_digest, temperature, summary, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._key(paper_id, model, prompt, temperature) + (summary, time.time()),
+            )
+            self._conn.commit()
+
+    def invalidate(self, model=None, prompt=None, paper_id=None):
+        """条件に合う要約を削除し、削除件数を返す（条件なしなら全削除）"""
+        clauses, params = [], []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if prompt is not None:
+            clauses.append("prompt_digest = ?")
+            params.append(prompt_digest(prompt))
+        if paper_id is not None:
+            base, version = split_version(paper_id)
+            clauses.append("paper_id = ?")
+            params.append(base)
+            if version:
+                clauses.append("version = ?")
+                params.append(version)
+        sql = "DELETE FROM summaries"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def summarized_ids(self, paper_ids):
+        """いずれかのモデル・プロンプトで要約済みの論文ID（版なし）の集合を返す"""
+        base_ids = list({split_version(paper_id)[0] for paper_id in paper_ids})
+        if not base_ids:
+            return set()
+        placeholders = ",".join("?" * len(base_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT paper_id FROM summaries WHERE paper_id IN ({placeholders})",
+                base_ids,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_summary_cache(cache_dir):
+    """cache_dir 配下の要約キャッシュDBを開く"""
+    return SummaryCache(os.path.join(cache_dir, SUMMARY_DB_NAME))
@@ -0,0 +1,301 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_LOG_NAME = "telemetry.jsonl"
+MAX_LOG_BYTES = 16 * 1024 * 1024  # これを超えたら telemetry.jsonl.1 に退避して書き直す
+METRIC_PREFIX = "paper_summary"
+# 処理段階ごとの所要時間のバケット（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RECENT_SAMPLES = 2048  # p50 / p95 の計算に使う直近のサンプル数
+
+STAGE_CACHE = "cache_lookup"
+STAGE_FETCH = "arxiv_fetch"
+STAGE_PARSE = "xml_parse"
+STAGE_LLM = "llm_call"
+STAGE_SLACK = "slack_post"
+STAGE_NOTION = "notion_save"
+
+
+def quantile(sorted_values, q):
+    """ソート済みの値の q 分位点（線形補間）"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Histogram:
+    """累積バケットと直近のサンプルを持つ所要時間のヒストグラム"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, recent=RECENT_SAMPLES):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+        self.recent.append(seconds)
+
+    def summary(self):
+        values = sorted(self.recent)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": quantile(values, 0.5),
+            "p95": quantile(values, 0.95),
+            "max": values[-1] if values else None,
+        }
+
+
+class _Frame:
+    """実行中のスパン（入れ子になったスパンの時間を親に伝える）"""
+
+    def __init__(self):
+        self.child_time = 0.0
+
+
+class Telemetry:
+    """処理段階ごとのスパンとカウンタをプロセス全体で集計する
+
+    Streamlit の全セッションは同じプロセスで動くため、ここに集めた値は
+    セッションをまたいだ集計になる。log_path を渡すとスパンを1件ずつ
+    JSON Lines で追記し、複数プロセスの値を後から突き合わせられる。
+    ログが max_log_bytes を超えたら1世代だけ残してローテーションする。
+    """
+
+    def __init__(self, log_path=None, buckets=LATENCY_BUCKETS, max_log_bytes=MAX_LOG_BYTES):
+        self.log_path = log_path
+        self.max_log_bytes = max_log_bytes
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """with ブロックの所要時間を stage の値として記録する
+
+        ブロック内で例外が起きればエラーとして数え、例外はそのまま送出する。
+        yield する辞書に値を足すと、JSONログの属性として残る。
+        """
+        attributes = dict(attributes)
+        stack = self._stack()
+        frame = _Frame()
+        stack.append(frame)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except GeneratorExit:
+            # ストリームを途中で閉じた場合はエラーではなく中断として残す
+            attributes["cancelled"] = True
+            raise
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1].child_time += elapsed
+            self.observe(stage, elapsed, error=error, **attributes)
+
+    def timed_iter(self, stage, iterable, **attributes):
+        """イテレータが次の要素を返すまでの時間の合計を stage として記録する
+
+        逐次パースのように、消費しながら処理が進むものに使う。
+        途中で呼ばれた別のスパン（ページごとの取得など）の時間は差し引く。
+        """
+        iterator = iter(iterable)
+        stack = self._stack()
+        total, items, error = 0.0, 0, None
+        try:
+            while True:
+                frame = _Frame()
+                stack.append(frame)
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                except BaseException as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - start
+                    stack.pop()
+                    if stack:
+                        stack[-1].child_time += elapsed
+                    total += elapsed - frame.child_time
+                items += 1
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self.observe(stage, total, error=error, items=items, **attributes)
+
+    def observe(self, stage, seconds, error=None, **attributes):
+        """計測済みの所要時間を記録する"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds, error=error is not None)
+        if self.log_path is not None:
+            record = dict(attributes, time=time.time(), stage=stage,
+                          seconds=round(seconds, 4), error=error)
+            self._append(record)
+
+    def count(self, name, value=1, **labels):
+        """カウンタ name{labels} に value を足す"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _append(self, record):
+        try:
+            with self._log_lock:
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._rotate()
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            # 計測のために本来の処理を止めない
+            logger.warning("failed to write telemetry log: %s", e)
+
+    def _rotate(self):
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return
+        if size >= self.max_log_bytes:
+            os.replace(self.log_path, self.log_path + ".1")
+
+    def snapshot(self):
+        """{"stages": {stage: 統計}, "counters": [...]} を返す"""
+        with self._lock:
+            stages = {stage: h.summary() for stage, h in sorted(self._histograms.items())}
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"started_at": self.started_at, "stages": stages, "counters": counters}
+
+    def counter_total(self, name, **labels):
+        """labels に一致するカウンタの合計"""
+        wanted = {k: str(v) for k, v in labels.items()}
+        with self._lock:
+            return sum(value for (counter, items), value in self._counters.items()
+                       if counter == name and wanted.items() <= dict(items).items())
+
+    def render_prometheus(self):
+        """Prometheus のテキスト形式で出力する"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            bucket_rows = [(stage, list(h.counts), h.sum, h.count, h.errors)
+                           for stage, h in histograms]
+
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Latency of each request stage.")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, counts, total, count, _ in bucket_rows:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_stage_errors_total"
+        lines.append(f"# HELP {name} Stage executions that raised an error.")
+        lines.append(f"# TYPE {name} counter")
+        for stage, _, _, _, errors in bucket_rows:
+            lines.append(f'{name}{{stage="{stage}"}} {errors}')
+
+        declared = set()
+        for (counter, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{counter}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve_metrics(telemetry, port, host="127.0.0.1"):
+    """/metrics で Prometheus 形式、/metrics.json で JSON を返すサーバーを別スレッドで起動する"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = telemetry.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(telemetry.snapshot()).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry():
+    """プロセス全体で共有する Telemetry を返す"""
+    return _telemetry
+
+
+def open_telemetry(cache_dir, log=False):
+    """共有の Telemetry を返す（log=True なら cache_dir 配下にJSONログを書く）"""
+    _telemetry.log_path = os.path.join(cache_dir, TELEMETRY_LOG_NAME) if log else None
+    return _telemetry
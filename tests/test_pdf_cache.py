@@ -0,0 +1,168 @@
+"""PdfCache のテスト（127.0.0.1 のスタブサーバーを使い、外部には接続しない）"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_session import PooledHttpSession
+from pdf_cache import PARTIAL_MAX_AGE, PdfCache
+
+PDF_BODY = b"%PDF-1.4\n" + b"0" * 1000 + b"\n%%EOF\n"
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class StubServer:
+    """パスごとの本体を返し、受け取ったリクエストヘッダーを記録する"""
+
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                body = stub.bodies.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if self.headers.get("If-None-Match") == ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", ETAG)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", ETAG)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self._server.server_port}{path}"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def http():
+    session = PooledHttpSession()
+    yield session
+    session.close()
+
+
+def open_cache(tmp_path, **kwargs):
+    return PdfCache(str(tmp_path / "pdfs"), **kwargs)
+
+
+def test_first_fetch_downloads_and_second_is_a_hit(tmp_path, server, http):
+    server.bodies["/pdf/2401.00001v1"] = PDF_BODY
+    cache = open_cache(tmp_path)
+    url = server.url("/pdf/2401.00001v1")
+
+    path = cache.fetch(http, url, "2401.00001v1")
+    with open(path, "rb") as f:
+        assert f.read() == PDF_BODY
+    assert cache.fetch(http, url, "2401.00001v1") == path
+
+    assert len(server.requests) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes_saved"] == len(PDF_BODY)
+    assert stats["bytes_downloaded"] == len(PDF_BODY)
+    assert (stats["entries"], stats["bytes"]) == (1, len(PDF_BODY))
+    cache.close()
+
+
+def test_expired_entry_is_revalidated_with_conditional_get(tmp_path, server, http):
+    server.bodies["/pdf/2401.00002"] = PDF_BODY
+    cache = open_cache(tmp_path, latest_max_age=0)
+    url = server.url("/pdf/2401.00002")
+
+    path = cache.fetch(http, url, "2401.00002")
+    assert cache.fetch(http, url, "2401.00002") == path
+
+    assert len(server.requests) == 2
+    _, headers = server.requests[1]
+    assert headers["If-None-Match"] == ETAG
+    assert headers["If-Modified-Since"] == LAST_MODIFIED
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"]) == (0, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes_saved"] == len(PDF_BODY)
+    assert stats["bytes_downloaded"] == len(PDF_BODY)
+    cache.close()
+
+
+def test_non_pdf_body_is_rejected(tmp_path, server, http):
+    server.bodies["/pdf/2401.00003v1"] = b"<html>rate limited</html>"
+    cache = open_cache(tmp_path)
+
+    with pytest.raises(ValueError):
+        cache.fetch(http, server.url("/pdf/2401.00003v1"), "2401.00003v1")
+
+    assert not [name for name in os.listdir(cache.directory)
+                if name.endswith((".pdf", ".part"))]
+    stats = cache.stats()
+    assert (stats["misses"], stats["entries"], stats["bytes_downloaded"]) == (0, 0, 0)
+    cache.close()
+
+
+def test_least_recently_used_entry_is_evicted_over_budget(tmp_path, server, http):
+    ids = ["2401.00011v1", "2401.00012v1", "2401.00013v1"]
+    for paper_id in ids:
+        server.bodies[f"/pdf/{paper_id}"] = PDF_BODY
+    cache = open_cache(tmp_path, max_bytes=len(PDF_BODY) * 2)
+
+    paths = {}
+    for paper_id in ids[:2]:
+        paths[paper_id] = cache.fetch(http, server.url(f"/pdf/{paper_id}"), paper_id)
+    # 1件目を使い直すと、2件目が最後に使われたのが最も古いものになる
+    cache.fetch(http, server.url(f"/pdf/{ids[0]}"), ids[0])
+    paths[ids[2]] = cache.fetch(http, server.url(f"/pdf/{ids[2]}"), ids[2])
+
+    assert os.path.exists(paths[ids[0]])
+    assert not os.path.exists(paths[ids[1]])
+    assert os.path.exists(paths[ids[2]])
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, len(PDF_BODY) * 2)
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+    cache.close()
+
+
+def test_only_stale_partial_files_are_removed(tmp_path):
+    directory = tmp_path / "pdfs"
+    directory.mkdir()
+    stale = directory / "stale.part"
+    fresh = directory / "fresh.part"
+    stale.write_bytes(b"%PDF-")
+    fresh.write_bytes(b"%PDF-")
+    old = time.time() - PARTIAL_MAX_AGE - 60
+    os.utime(stale, (old, old))
+
+    cache = PdfCache(str(directory))
+
+    assert not stale.exists()
+    assert fresh.exists()
+    cache.close()
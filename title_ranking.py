@@ -0,0 +1,122 @@
+import re
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from arxiv_cache import normalize_query
+
+HASH_DIM = 1 << 12           # トライグラム・トークンを畳み込む次元数
+TRIGRAM_WEIGHT = 0.45
+TOKEN_WEIGHT = 0.2           # Jaccard係数
+COVERAGE_WEIGHT = 0.35       # クエリのトークンがタイトルに含まれる割合
+EXACT_TITLE_BOOST = 0.3
+PREFIX_BOOST = 0.1           # タイトルがクエリで始まる
+NAME_BOOST = 0.2             # 「BERT: ...」のようにクエリが論文の名前になっている
+RECENCY_WEIGHT = 0.05
+RECENCY_HALF_LIFE_DAYS = 365 * 3
+CONFIDENCE_THRESHOLD = 0.75
+SHORTLIST_SIZE = 5
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _bucket(feature):
+    # 組み込みの hash() はプロセスごとに変わるため crc32 を使う
+    return zlib.crc32(feature.encode("utf-8")) % HASH_DIM
+
+
+def _features(text):
+    normalized = normalize_query(text)
+    tokens = _TOKEN_RE.findall(normalized)
+    padded = " " + " ".join(tokens) + " "
+    trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return " ".join(tokens), tokens, trigrams
+
+
+def _matrices(texts):
+    """トライグラムの頻度行列（L2正規化）とトークンの有無行列を作る"""
+    n = len(texts)
+    trigram_matrix = np.zeros((n, HASH_DIM), dtype=np.float32)
+    token_matrix = np.zeros((n, HASH_DIM), dtype=np.float32)
+    normalized = []
+    for row, text in enumerate(texts):
+        joined, tokens, trigrams = _features(text)
+        normalized.append(joined)
+        if trigrams:
+            np.add.at(trigram_matrix[row], [_bucket(t) for t in trigrams], 1.0)
+        if tokens:
+            token_matrix[row, [_bucket(t) for t in set(tokens)]] = 1.0
+    norms = np.linalg.norm(trigram_matrix, axis=1, keepdims=True)
+    trigram_matrix /= np.maximum(norms, 1e-12)
+    return trigram_matrix, token_matrix, normalized
+
+
+def _recency(candidates, now=None):
+    now = now or datetime.now(timezone.utc)
+    ages = np.empty(len(candidates), dtype=np.float32)
+    for i, candidate in enumerate(candidates):
+        published = candidate.get('published_datetime')
+        if isinstance(published, datetime):
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=timezone.utc)
+            ages[i] = max((now - published).days, 0)
+        else:
+            ages[i] = np.inf
+    return np.exp2(-ages / RECENCY_HALF_LIFE_DAYS)
+
+
+def rank_candidates(query, candidates):
+    """候補をクエリとの一致度で並べ替え、[(候補, スコア, 確信度), ...] を返す
+
+    確信度はタイトルの一致度（0〜1）、スコアはそれに新しさを少し加えたもの。
+    すべての候補を行列にまとめ、一度の行列積で計算する。
+    """
+    if not candidates:
+        return []
+    trigram_matrix, token_matrix, normalized = _matrices(
+        [query] + [candidate.get('title', '') for candidate in candidates]
+    )
+    query_trigrams, titles_trigrams = trigram_matrix[0], trigram_matrix[1:]
+    query_tokens, titles_tokens = token_matrix[0], token_matrix[1:]
+
+    trigram_sim = titles_trigrams @ query_trigrams
+    overlap = titles_tokens @ query_tokens
+    query_size = query_tokens.sum()
+    union = titles_tokens.sum(axis=1) + query_size - overlap
+    jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+    coverage = overlap / query_size if query_size else np.zeros_like(overlap)
+
+    query_text = normalized[0]
+    titles = np.array(normalized[1:], dtype=object)
+    exact = (titles == query_text).astype(np.float32)
+    prefix = np.array([bool(query_text) and title.startswith(query_text) for title in titles],
+                      dtype=np.float32)
+    name_re = re.compile(re.escape(normalize_query(query)) + r"\s*:")
+    named = np.array([bool(name_re.match(normalize_query(candidate.get('title', ''))))
+                      for candidate in candidates], dtype=np.float32)
+
+    confidence = (TRIGRAM_WEIGHT * trigram_sim + TOKEN_WEIGHT * jaccard
+                  + COVERAGE_WEIGHT * coverage + EXACT_TITLE_BOOST * exact
+                  + PREFIX_BOOST * prefix + NAME_BOOST * named)
+    confidence = np.clip(confidence, 0.0, 1.0)
+    scores = confidence + RECENCY_WEIGHT * _recency(candidates)
+
+    order = np.argsort(-scores, kind="stable")
+    return [(candidates[i], float(scores[i]), float(confidence[i])) for i in order]
+
+
+def best_match(query, candidates, threshold=CONFIDENCE_THRESHOLD, shortlist_size=SHORTLIST_SIZE):
+    """最良の候補を選ぶ
+
+    (最良の候補, 確信度, 上位候補のリスト) を返す。確信度が threshold 未満なら
+    呼び出し側で上位候補を提示できるよう、リストには shortlist_size 件まで入る。
+    """
+    ranked = rank_candidates(query, candidates)
+    if not ranked:
+        return None, 0.0, []
+    best, _, confidence = ranked[0]
+    shortlist = [candidate for candidate, _, _ in ranked[:shortlist_size]]
+    if confidence >= threshold:
+        shortlist = shortlist[:1]
+    return best, confidence, shortlist